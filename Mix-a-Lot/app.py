@@ -1,12 +1,15 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, render_template, request, jsonify, url_for
+import atexit
 import json
+import threading
 import time
 import sys
-from gpiozero import DigitalOutputDevice, GPIOZeroError, Device
-from gpiozero.pins.lgpio import LGPIOFactory
-
-# Set lgpio as the default pin factory
-Device.pin_factory = LGPIOFactory()
+from config_store import ConfigStore
+import estop
+import metrics
+from event_stream import Broadcaster
+from job_runner import QUEUED, RUNNING, JobCancelled, JobRunner
+from pump_client import PumpClient, PumpDaemonError
 
 app = Flask(__name__)
 
@@ -15,106 +18,95 @@ CONFIG_FILE = 'pumpen.json'  # Path to JSON configuration file
 TEST_DURATION_SECONDS = 1.0  # Duration for each direction (forward/backward)
 DELAY_BETWEEN_DIRECTIONS = 0.5 # Short pause between direction changes
 DELAY_BETWEEN_PUMPS = 1.0      # Pause between testing different pumps
-FORWARD_LEVEL = 0    # Level for forward direction
-BACKWARD_LEVEL = 1   # Level for backward direction
+SWEEP_MAX_DURATION = 10.0  # Longest run per direction /sweep accepts, in seconds
+JOB_KINDS = ('test-pump', 'sweep')  # Every kind reported by mixalot_jobs, even at 0
+
+# Parsed pumpen.json, re-read only when the file changes
+config_store = ConfigStore(CONFIG_FILE)
+max_parallel_pumps = config_store.max_parallel_pumps()  # Pump tests and sweep pumps run at once
+
+# Pushes pump edges, job progress and e-stops to every open page (/events)
+events = Broadcaster()
+
+# This server's part of /metrics; the pump and pour metrics come from the daemon
+app_metrics = metrics.Registry()
+request_seconds = app_metrics.register(metrics.Histogram(
+    'mixalot_http_request_duration_seconds', 'Time to answer a request (to the first byte for /events)',
+    ['route', 'method', 'status']))
+jobs_gauge = app_metrics.register(metrics.Gauge(
+    'mixalot_jobs', 'Pump test and sweep jobs queued or running', ['kind', 'state']))
+jobs_gauge_lock = threading.Lock()  # Keeps concurrent scrapes from mixing their counts
+pumpd_up = app_metrics.register(metrics.Gauge(
+    'mixalot_pumpd_up', '1 if the pump daemon answered this scrape'))
 
-# Global variable for initialized devices
-pump_gpio_devices = {}
+# Long pump operations run here so requests return at once
+job_runner = JobRunner(max_parallel_pumps, on_change=lambda job: events.publish('job', job.to_dict()))
+pump_jobs_lock = threading.Lock()  # Makes checking for a running test or sweep and queueing one atomic
 
-def load_config(filename):
-    """Load pump configuration from a JSON file."""
+def on_pump_event(event, data):
+    """Forward the daemon's pump edges and emergency stops to every open page."""
+    if event == 'estop':
+        job_runner.cancel_all()  # The daemon already stopped the running tests; fail the queued ones
+    events.publish(event, data)
+
+# The pump daemon owns the GPIO pins (see pump_daemon.py); this server is one of its clients
+pumpd = PumpClient(on_event=on_pump_event)
+
+def run_pump_test(pump_id, direction, duration):
+    """Run one pump in the daemon for duration seconds; returns True if it was stopped early."""
+    print(f"  -> Pump {pump_id} {direction} ({duration}s)...")
+    result = pumpd.call('run', timeout=None, pump_id=pump_id, direction=direction, duration=duration)
+    print("     Stopped.")
+    return result['stopped']
+
+def stop_all_pumps(source='web'):
+    """Emergency stop of every pump, whichever client started it.
+
+    Returns one report (name, pid, pins, latency_ms) per process that answered.
+    """
+    print("\nNOT-STOP: Stopping all pumps...")
+    job_runner.cancel_all()
     try:
-        with open(filename, 'r') as f:
-            config = json.load(f)
-        if 'pumps' not in config or not isinstance(config['pumps'], list):
-            print(f"Error: '{filename}' does not contain a valid 'pumps' array.")
-            return None  # Signal an error
-        return config['pumps']
-    except FileNotFoundError:
-        print(f"Error: Configuration file '{filename}' not found.")
-        return None
-    except json.JSONDecodeError:
-        print(f"Error: Configuration file '{filename}' is not valid JSON.")
-        return None
-    except Exception as e:
-        print(f"An unexpected error occurred while loading the configuration: {e}")
-        return None
+        return pumpd.call('stop', source=source)['processes']
+    except PumpDaemonError as e:
+        # The daemon's e-stop socket may still answer when this connection does not
+        print(f"  ! {e}, stopping through estop.py")
+        return estop.broadcast(source)
 
-def setup_pump_gpio(pump_config):
-    """Initialize GPIO devices for a pump. Returns (power_pin, direction_pin) on success, else (None, None)."""
+def pump_busy(pump_id):
+    """True if the daemon is running pump_id for any client."""
+    pumps = pumpd.call('status')['pumps']
+    return any(pump['pump_id'] == pump_id and pump['busy'] for pump in pumps)
+
+atexit.register(job_runner.shutdown)  # Runs last: pumpd.close() has stopped the running jobs' pumps
+atexit.register(pumpd.close)
+atexit.register(events.close)  # Runs first: ends open /events streams
+
+def pump_snapshot():
+    """Current state of every pump and the unfinished jobs, for new /events clients."""
     try:
-        print(f"- Initializing Pump {pump_config.get('id')} (Power: GPIO{pump_config.get('gpio_pin')}, Direction: GPIO{pump_config.get('direction_pin')})")
-        power_pin = DigitalOutputDevice(pump_config['gpio_pin'], initial_value=False)
-        direction_pin = DigitalOutputDevice(pump_config['direction_pin'], initial_value=False)
-        return power_pin, direction_pin
-    except GPIOZeroError as e:
-        print(f"  ! GPIO error initializing for Pump {pump_config.get('id')} "
-              f"(Pins: {pump_config.get('gpio_pin')}, {pump_config.get('direction_pin')}): {e}")
-        return None, None
-    except KeyError as e:
-        print(f"  ! Error: Missing key '{e}' in configuration for Pump {pump_config.get('id')}.")
-        return None, None
-    except Exception as e:
-        print(f"  ! Unexpected error initializing Pump {pump_config.get('id')}: {e}")
-        return None, None
-
-def run_forward(power_pin, direction_pin, duration):
-    """Run the pump forward for a specified duration."""
-    print(f"  -> Forward ({duration}s)...")
-    direction_pin.value = FORWARD_LEVEL  # Set direction
-    time.sleep(0.1)  # Short pause to ensure direction is set
-    power_pin.on()       # Turn on pump
-    time.sleep(duration) # Let it run
-    power_pin.off()      # Turn off pump
-    print("     Stopped.")
+        pumps = pumpd.call('status')['pumps']
+    except PumpDaemonError as e:
+        print(f"  ! Pump state unavailable: {e}")
+        pumps = []
+    return {'pumps': pumps, 'jobs': [job.to_dict() for job in job_runner.active()]}
 
-def run_backward(power_pin, direction_pin, duration):
-    """Run the pump backward for a specified duration."""
-    print(f"  -> Backward ({duration}s)...")
-    direction_pin.value = BACKWARD_LEVEL  # Set direction
-    time.sleep(0.1)  # Short pause
-    power_pin.on()        # Turn on pump
-    time.sleep(duration)  # Let it run
-    power_pin.off()       # Turn off pump
-    print("     Stopped.")
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
 
-def stop_all_pumps():
-    """Stop all successfully initialized pumps immediately."""
-    print("\nNOT-STOP: Stopping all initialized pumps...")
-    global pump_gpio_devices
-    stopped_count = 0
-    for pump_id, devices in pump_gpio_devices.items():
-        power_pin, _ = devices  # Direction pin is irrelevant here
-        if power_pin:
-            try:
-                power_pin.off()
-                stopped_count += 1
-            except Exception as e:
-                print(f"  ! Error stopping Pump {pump_id}: {e}")
-    print(f"{stopped_count} pump(s) stopped.")
-
-def cleanup_gpio():
-    """Release all used GPIO resources."""
-    print("\nCleaning up GPIO pins...")
-    global pump_gpio_devices
-    closed_count = 0
-    for pump_id, devices in pump_gpio_devices.items():
-        power_pin, direction_pin = devices
-        try:
-            if power_pin:
-                power_pin.close()
-            if direction_pin:
-                direction_pin.close()
-            closed_count += 1
-        except Exception as e:
-            print(f"  ! Error closing pins for Pump {pump_id}: {e}")
-    print(f"{closed_count} pump GPIO pairs released.")
-    pump_gpio_devices.clear()  # Clear the dictionary
+@app.after_request
+def record_latency(response):
+    # The route pattern, not the path, so /jobs/<job_id> stays one series
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    request_seconds.observe(time.perf_counter() - g.request_started,
+                            route=route, method=request.method, status=response.status_code)
+    return response
 
 @app.route('/')
 def index():
     """Render main page"""
-    config = load_config(CONFIG_FILE)
+    config = config_store.pumps()
     if config:
         return render_template('index.html', pumps=config)
     return "Error loading configuration", 500
@@ -122,46 +114,110 @@ def index():
 @app.route('/test-pump', methods=['POST'])
 def test_pump():
     """Test a single pump"""
-    data = request.json
+    data = request.get_json(silent=True) or {}
     pump_id = data.get('pump_id')
     direction = data.get('direction')
-    config = load_config(CONFIG_FILE)
+    if not isinstance(pump_id, int) or isinstance(pump_id, bool):
+        return jsonify({'success': False, 'message': 'pump_id must be a whole number'}), 400
+    if direction not in ('forward', 'backward'):
+        return jsonify({'success': False, 'message': "direction must be 'forward' or 'backward'"}), 400
+    config = config_store.pumps()
     
     if not config:
         return jsonify({'success': False, 'message': 'Failed to load configuration'})
     
     # Find pump configuration
-    pump_config = next((p for p in config if p['id'] == pump_id), None)
+    pump_config = config_store.get_pump(pump_id)
     if not pump_config:
         return jsonify({'success': False, 'message': 'Pump not found'})
     
+    if not pumpd.connected:
+        return jsonify({'success': False, 'message': 'Pump daemon not running'})
+    
+    def run_test(job):
+        # Runs on the job runner; the daemon reports the pump busy to everyone else meanwhile
+        stopped = run_pump_test(pump_id, direction, TEST_DURATION_SECONDS)
+        if stopped:
+            raise JobCancelled(f'Pump {pump_id} test stopped')
+        return f'Pump {pump_id} successfully tested'
+    
+    with pump_jobs_lock:
+        if any(job.kind == 'test-pump' and job.params.get('pump_id') == pump_id
+               for job in job_runner.active()):
+            return jsonify({'success': False, 'message': f'Pump {pump_id} is already running'})
+        try:
+            job = job_runner.submit('test-pump', run_test, {'pump_id': pump_id, 'direction': direction})
+        except Exception as e:
+            return jsonify({'success': False, 'message': f'Error testing pump {pump_id}: {str(e)}'})
+    
+    return jsonify({
+        'success': True,
+        'message': f'Pump {pump_id} test queued',
+        'job_id': job.id,
+        'status_url': url_for('job_status', job_id=job.id)
+    }), 202
+
+@app.route('/sweep', methods=['POST'])
+def start_sweep():
+    """Test every pump forward and backward, several at once"""
+    data = request.get_json(silent=True) or {}
+    config = config_store.pumps()
+    if not config:
+        return jsonify({'success': False, 'message': 'Failed to load configuration'})
     try:
-        # Setup GPIO and store in global dictionary
-        power_pin, direction_pin = setup_pump_gpio(pump_config)
-        if not power_pin or not direction_pin:
-            return jsonify({'success': False, 'message': f'Failed to setup GPIO for pump {pump_id} (Power: GPIO{pump_config["gpio_pin"]}, Direction: GPIO{pump_config["direction_pin"]})'})
-        
-        # Store the pins in the global dictionary for cleanup
-        pump_gpio_devices[pump_id] = (power_pin, direction_pin)
-        
-        # Run pump
-        if direction == 'forward':
-            run_forward(power_pin, direction_pin, TEST_DURATION_SECONDS)
-        else:
-            run_backward(power_pin, direction_pin, TEST_DURATION_SECONDS)
-        
-        # Cleanup
-        cleanup_gpio()
-        
-        return jsonify({
-            'success': True,
-            'message': f'Pump {pump_id} successfully tested'
-        })
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'message': f'Error testing pump {pump_id}: {str(e)}'
-        })
+        max_parallel = int(data.get('max_parallel', max_parallel_pumps))
+        duration = float(data.get('duration', TEST_DURATION_SECONDS))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'max_parallel and duration must be numbers'}), 400
+    if max_parallel < 1 or not 0 < duration <= SWEEP_MAX_DURATION:
+        return jsonify({'success': False, 'message': f'max_parallel must be at least 1 and duration '
+                                                     f'between 0 and {SWEEP_MAX_DURATION}s'}), 400
+    if not pumpd.connected:
+        return jsonify({'success': False, 'message': 'Pump daemon not running'})
+    pump_count = len(config)
+    
+    def run_sweep(job):
+        # Per-pump results go out on /events as each pump finishes
+        job.result = {'results': []}
+        def on_result(event, result):
+            job.result['results'].append(result)
+            job_runner.report(job)
+        summary = pumpd.call('sweep', timeout=None, on_progress=on_result,
+                             max_parallel=max_parallel, duration=duration)
+        job.result = summary
+        message = (f"Sweep: {summary['passed']} passed, {summary['failed']} failed "
+                   f"in {summary['total_seconds']:.1f}s")
+        if summary['stopped']:
+            raise JobCancelled(message + ' (stopped)')
+        return message
+    
+    with pump_jobs_lock:
+        if any(job.kind == 'sweep' for job in job_runner.active()):
+            return jsonify({'success': False, 'message': 'A sweep is already running'})
+        try:
+            job = job_runner.submit('sweep', run_sweep, {'max_parallel': max_parallel, 'duration': duration,
+                                                         'pumps': pump_count})
+        except Exception as e:
+            return jsonify({'success': False, 'message': f'Error starting sweep: {str(e)}'})
+    return jsonify({
+        'success': True,
+        'message': f'Sweep of {pump_count} pumps queued',
+        'job_id': job.id,
+        'status_url': url_for('job_status', job_id=job.id)
+    }), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """State of a pump job: queued, running, done or failed"""
+    job = job_runner.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': f'Job {job_id} not found'}), 404
+    return jsonify(dict(job.to_dict(), success=True))
+
+@app.route('/jobs')
+def list_jobs():
+    """Recent pump jobs, newest first"""
+    return jsonify({'success': True, 'jobs': job_runner.jobs()})
 
 @app.route('/swap-pins', methods=['POST'])
 def swap_pins():
@@ -173,26 +229,28 @@ def swap_pins():
         
         pump_id = data['pump_id']
         
-        # Load and validate configuration
-        with open(CONFIG_FILE, 'r') as f:
-            config = json.load(f)
-            
-        if 'pumps' not in config:
-            return jsonify({'success': False, 'message': 'Invalid configuration file structure'})
-            
         # Find pump configuration
-        pump = next((p for p in config['pumps'] if p['id'] == pump_id), None)
-        if not pump:
+        if not config_store.get_pump(pump_id):
             return jsonify({'success': False, 'message': f'Pump {pump_id} not found'})
-            
-        # Swap the pins in the configuration
-        temp = pump['gpio_pin']
-        pump['gpio_pin'] = pump['direction_pin']
-        pump['direction_pin'] = temp
+        if pump_busy(pump_id):
+            return jsonify({'success': False, 'message': f'Pump {pump_id} is running, try again when it has stopped'})
+        
+        def swap(config):
+            # Swap the pins in the configuration
+            pump = next(p for p in config['pumps'] if p['id'] == pump_id)
+            pump['gpio_pin'], pump['direction_pin'] = pump['direction_pin'], pump['gpio_pin']
+            return pump
+        
+        # Save the updated configuration (atomically, readers never see a partial file)
+        pump = config_store.update(swap)
         
-        # Save the updated configuration
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump(config, f, indent=2)
+        # The daemon rebuilds only this pump's devices for its new pins
+        try:
+            pumpd.call('sync')
+        except PumpDaemonError as e:
+            print(f"  ! {e}; the daemon picks up the new pins with its next command")
+        events.publish('config', {'pump_id': pump_id, 'gpio_pin': pump['gpio_pin'],
+                                  'direction_pin': pump['direction_pin']})
         
         return jsonify({
             'success': True,
@@ -214,10 +272,49 @@ def swap_pins():
 
 @app.route('/stop-all', methods=['POST'])
 def stop_all():
-    """Stop all pumps and cleanup GPIO"""
-    stop_all_pumps()
-    cleanup_gpio()
-    return jsonify({'success': True, 'message': 'All pumps stopped and GPIO cleaned up'})
+    """Stop all pumps, the web tests' and the kiosk's"""
+    reports = stop_all_pumps()
+    return jsonify({
+        'success': True,
+        'message': f'All pumps stopped ({len(reports)} process(es))',
+        'processes': reports
+    })
+
+@app.route('/events')
+def event_stream():
+    """Server-Sent Events: pump edges, direction changes, jobs, e-stops and pin swaps"""
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    return Response(events.stream(pump_snapshot, last_event_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/timing-stats')
+def timing_stats():
+    """Planned-vs-actual error of every pump edge the daemon switched so far"""
+    try:
+        return jsonify(pumpd.call('timing'))
+    except PumpDaemonError as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics of this server and of the pump daemon"""
+    with jobs_gauge_lock:
+        # Every series keeps a value, 0 included, so a scrape never sees one vanish
+        counts = {(kind, state): 0 for kind in JOB_KINDS for state in (QUEUED, RUNNING)}
+        for job in job_runner.active():
+            counts[job.kind, job.state] = counts.get((job.kind, job.state), 0) + 1
+        for (kind, state), count in counts.items():
+            jobs_gauge.set(count, kind=kind, state=state)
+    try:
+        pump_text = pumpd.call('metrics')['text']
+        pumpd_up.set(1)
+    except PumpDaemonError as e:
+        print(f"  ! Pump metrics unavailable: {e}")
+        pump_text = ''
+        pumpd_up.set(0)
+    return Response(app_metrics.render() + pump_text, content_type=metrics.CONTENT_TYPE)
 
 if __name__ == '__main__':
+    if not pumpd.connected:
+        print(f"Pump daemon not running ({pumpd.path}); start it with: python3 pump_daemon.py")
     app.run(host='0.0.0.0', port=8000)
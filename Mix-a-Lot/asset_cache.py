@@ -0,0 +1,149 @@
+"""On-disk cache of display-ready kiosk images.
+
+Decoding a PNG, rotating it for the vertical screen and scaling it takes
+most of the kiosk's startup time, and the systemd unit restarts the
+kiosk after every crash. The final pixels are therefore stored as raw
+surface buffers in the display's own pixel format. A warm start copies
+them straight back into a surface, with no decoding and no conversion.
+
+Entries are keyed by the source file (path, size, mtime), the kind of
+processing, the screen size, the orientation and the pixel format, so a
+changed image or display setup never serves stale pixels.
+"""
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+
+import pygame
+
+HEADER_SIZE = struct.Struct('<I')  # Length of the JSON header that precedes the pixels
+TIMINGS_FILE = 'startup_timings.json'
+
+
+class AssetCache:
+    """Raw pixel cache for processed images, plus startup timing bookkeeping."""
+
+    def __init__(self, cache_dir, screen_size, orientation):
+        self.cache_dir = cache_dir
+        self.screen_size = tuple(screen_size)
+        self.orientation = orientation
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # load() may run on several threads at startup
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+        except OSError as e:
+            print(f"Asset cache disabled, cannot create {cache_dir}: {e}")
+            self.cache_dir = None
+
+    def _pixel_format(self):
+        display = pygame.display.get_surface()
+        if display is None:
+            return None
+        return display.get_bitsize(), tuple(display.get_masks())
+
+    def _entry_path(self, source_path, variant, pixel_format):
+        stat = os.stat(source_path)
+        key = json.dumps([os.path.abspath(source_path), stat.st_size, stat.st_mtime_ns,
+                          variant, self.screen_size, self.orientation, pixel_format])
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest() + '.raw')
+
+    def load(self, source_path, variant, build):
+        """Return the processed surface for source_path.
+
+        variant names the processing (e.g. 'background'); build(source_path)
+        produces the surface in display format on a cache miss.
+        """
+        pixel_format = self._pixel_format()
+        if self.cache_dir is None or pixel_format is None:
+            self._count(hit=False)
+            return build(source_path)
+
+        entry_path = self._entry_path(source_path, variant, pixel_format)
+        surface = self._read(entry_path)
+        if surface is not None:
+            self._count(hit=True)
+            return surface
+
+        self._count(hit=False)
+        surface = build(source_path)
+        self._write(entry_path, surface)
+        return surface
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _read(self, entry_path):
+        try:
+            with open(entry_path, 'rb') as f:
+                (header_size,) = HEADER_SIZE.unpack(f.read(HEADER_SIZE.size))
+                header = json.loads(f.read(header_size))
+                pixels = f.read()
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Ignoring damaged asset cache entry {entry_path}: {e}")
+            return None
+
+        surface = pygame.Surface(tuple(header['size']), 0, header['bitsize'], header['masks'])
+        if surface.get_pitch() != header['pitch'] or len(pixels) != header['pitch'] * header['size'][1]:
+            return None
+        surface.get_buffer().write(pixels, 0)
+        return surface
+
+    def _write(self, entry_path, surface):
+        header = json.dumps({
+            'size': surface.get_size(),
+            'bitsize': surface.get_bitsize(),
+            'masks': list(surface.get_masks()),
+            'pitch': surface.get_pitch(),
+        }).encode()
+        try:
+            fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(HEADER_SIZE.pack(len(header)))
+                    f.write(header)
+                    f.write(surface.get_buffer().raw)
+                os.replace(temp_path, entry_path)
+            except BaseException:
+                os.unlink(temp_path)  # Nothing else would ever remove it
+                raise
+        except OSError as e:
+            print(f"Could not write asset cache entry: {e}")
+
+    def report_startup(self, seconds):
+        """Print how long image loading took and compare with the other kind of start.
+
+        A start where every image came from the cache counts as warm, any
+        other as cold. The last time of each kind is kept in the cache dir.
+        """
+        kind = 'warm' if self.misses == 0 and self.hits > 0 else 'cold'
+        print(f"Loaded {self.hits + self.misses} images in {seconds * 1000:.1f} ms "
+              f"({kind} start: {self.hits} cached, {self.misses} processed)")
+        if self.cache_dir is None:
+            return
+
+        timings_path = os.path.join(self.cache_dir, TIMINGS_FILE)
+        try:
+            with open(timings_path, 'r') as f:
+                timings = json.load(f)
+        except (OSError, ValueError):
+            timings = {}
+        timings[kind] = seconds
+        if 'cold' in timings and 'warm' in timings and timings['warm'] > 0:
+            print(f"  Image startup: cold {timings['cold'] * 1000:.1f} ms, "
+                  f"warm {timings['warm'] * 1000:.1f} ms "
+                  f"({timings['cold'] / timings['warm']:.1f}x faster warm)")
+        try:
+            with open(timings_path, 'w') as f:
+                json.dump(timings, f)
+        except OSError:
+            pass
@@ -0,0 +1,259 @@
+"""Headless rendering benchmark for the cocktail kiosk.
+
+Runs CocktailMixer on SDL's dummy video driver against a pump daemon with
+simulated GPIO and a virtual pump clock, replays scripted input (idle,
+swipe storms, taps and the mixing animation) and reports frames per
+second, frame-time percentiles and peak memory for menus of several sizes. Every menu size
+runs in its own process, so peak memory is per size. No Pi, display or
+drink images are needed; the menus and images are generated.
+
+    python3 benchmark_ui.py [--sizes 8,50,200,500] [--frames 300]
+                            [--save-baseline FILE] [--baseline FILE]
+
+With --baseline, a p95 frame time, startup time or peak memory more than
+--tolerance above the saved run is reported as a regression and the
+exit status is 1.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+DEFAULT_SIZES = '8,50,200,500'
+SCENARIOS = ('idle', 'swipe_storm', 'taps', 'mixing')
+SYNTHETIC_IMAGES = 8  # Distinct generated drink images; bigger menus reuse them
+MIN_REGRESSION_MS = 0.5  # p95 growth below this is timer noise, not a regression
+TOUCH_Y = 300  # Touches land on the image band, clear of the stop button
+
+
+def make_catalog(directory, size):
+    """Write cocktails.json, the pump configs and drink_logos/ for a menu of size cocktails."""
+    import pygame
+
+    with open('cocktails.json', 'r') as f:
+        base = json.load(f)['cocktails']
+    cocktails = []
+    for i in range(size):
+        cocktail = dict(base[i % len(base)])
+        if i >= len(base):
+            cocktail['normal_name'] = f"{cocktail['normal_name']} {i + 1}"
+        cocktails.append(cocktail)
+    with open(os.path.join(directory, 'cocktails.json'), 'w') as f:
+        json.dump({'cocktails': cocktails}, f)
+    for name in ('pump_config.json', 'pumpen.json'):
+        with open(name, 'r') as f:
+            pump_config = f.read()
+        with open(os.path.join(directory, name), 'w') as f:
+            f.write(pump_config)
+
+    # Landscape images like the real logos, so decoding, rotating and scaling cost the same
+    logos = os.path.join(directory, 'drink_logos')
+    os.makedirs(logos)
+    for i in range(SYNTHETIC_IMAGES):
+        image = pygame.Surface((800, 600))
+        image.fill((40 + 25 * i, 90, 200 - 20 * i))
+        pygame.draw.circle(image, (255, 255, 255), (400, 300), 120 + 15 * i)
+        pygame.image.save(image, os.path.join(logos, f"synthetic_{i}.png"))
+    for name in ('tipsy', 'pouring'):
+        image = pygame.Surface((800, 480))
+        image.fill((20, 20, 60) if name == 'tipsy' else (60, 20, 20))
+        pygame.image.save(image, os.path.join(logos, f"{name}.png"))
+    spinner = pygame.Surface((256, 256), pygame.SRCALPHA)
+    pygame.draw.arc(spinner, (255, 255, 255), spinner.get_rect().inflate(-20, -20), 0, 5, 24)
+    pygame.image.save(spinner, os.path.join(logos, 'loading.png'))
+    for i, cocktail in enumerate(cocktails):
+        name = cocktail['normal_name'].lower().replace(' ', '_')
+        os.symlink(f"synthetic_{i % SYNTHETIC_IMAGES}.png", os.path.join(logos, f"{name}.png"))
+
+
+def touch_script(pygame, x_from, x_to, steps=4):
+    """Frames of one touch: press, `steps` moves, release."""
+    frames = [[pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=(x_from, TOUCH_Y), button=1)]]
+    for step in range(1, steps + 1):
+        x = x_from + (x_to - x_from) * step // steps
+        frames.append([pygame.event.Event(pygame.MOUSEMOTION, pos=(x, TOUCH_Y), rel=(0, 0), buttons=(1, 0, 0))])
+    frames.append([pygame.event.Event(pygame.MOUSEBUTTONUP, pos=(x_to, TOUCH_Y), button=1)])
+    return frames
+
+
+def build_script(pygame, scenario, frames):
+    """Return a list of per-frame event lists for a scenario."""
+    script = []
+    if scenario == 'swipe_storm':
+        # Flicks that start before the previous swipe settles, mostly forwards
+        while len(script) < frames:
+            forward = len(script) % 70 < 60
+            script += touch_script(pygame, 420, 40) if forward else touch_script(pygame, 40, 420)
+            script += [[]] * 2
+    elif scenario == 'taps':
+        # Tap to pour, then let the (virtual-clock) pour finish
+        while len(script) < frames:
+            script += touch_script(pygame, 240, 242, steps=1)
+            script += [[]] * 20
+    else:
+        script = [[] for _ in range(frames)]
+    return script[:frames]
+
+
+def replay(kiosk, mixer, script):
+    """Run one main-loop iteration per script entry, uncapped; returns frame stats."""
+    from frame_stats import RollingStats
+
+    stats = RollingStats(window=len(script))
+    started = time.perf_counter()
+    for events in script:
+        frame_started = time.perf_counter()
+        kiosk.handle_events(mixer, events, frame_started)
+        mixer.update()
+        mixer.draw(mixer.offset)
+        stats.record((time.perf_counter() - frame_started) * 1000)
+    elapsed = time.perf_counter() - started
+    summary = stats.summary()
+    summary['fps'] = len(script) / elapsed if elapsed > 0 else 0.0
+    return summary
+
+
+def run_worker(size, frames, output):
+    """Benchmark one menu size in this process (cwd is the generated catalog)."""
+    os.environ.update({
+        'SDL_VIDEODRIVER': 'dummy',
+        'MIXALOT_BACKEND': 'sim',
+        'MIXALOT_CLOCK': 'virtual',
+        'MIXALOT_FRAME_STATS': '',
+        'MIXALOT_ASSET_CACHE': os.path.abspath('asset_cache'),
+        'MIXALOT_PUMPD_SOCKET': os.path.abspath('pumpd.sock'),
+        'MIXALOT_ESTOP_DIR': os.path.abspath('estop'),
+    })
+    import pygame
+    import cocktail_interface as kiosk
+    import hardware
+    import pump_daemon
+
+    # The kiosk pours through a pump daemon; run one in this process on the virtual clock
+    hardware.setup_pin_factory()
+    daemon = pump_daemon.PumpDaemon()
+    daemon.start()
+    threading.Thread(target=daemon.serve_forever, daemon=True).start()
+
+    kiosk.screen = pygame.display.set_mode((kiosk.SCREEN_WIDTH, kiosk.SCREEN_HEIGHT))
+    started = time.perf_counter()
+    mixer = kiosk.CocktailMixer()
+    mixer.draw(mixer.offset)
+    startup_ms = (time.perf_counter() - started) * 1000
+    assets = mixer.mixing_assets_loading.result()
+
+    scenarios = {}
+    for scenario in SCENARIOS:
+        if scenario == 'mixing':
+            # Animation frames only; the pour itself is covered by taps
+            mixer.mixing = True
+            mixer.mixing_animation = kiosk.MixingAnimation(mixer.background, assets)
+        scenarios[scenario] = replay(kiosk, mixer, build_script(pygame, scenario, frames))
+        mixer.animator.cancel('swipe')
+        mixer.mixing = False
+        mixer.mixing_animation = None
+        mixer.offset = 0
+        mixer.invalidate()
+
+    mixer.dispenser.shutdown()
+    mixer.images.close()
+    daemon.close()
+    result = {
+        'startup_ms': startup_ms,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'scenarios': scenarios,
+    }
+    with open(output, 'w') as f:
+        json.dump(result, f)
+
+
+def run_size(size, frames, verbose):
+    with tempfile.TemporaryDirectory(prefix='mixalot-bench-') as directory:
+        make_catalog(directory, size)
+        output = os.path.join(directory, 'result.json')
+        command = [sys.executable, os.path.abspath(__file__),
+                   '--worker', str(size), '--frames', str(frames), '--output', output]
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run(command, cwd=directory, env=env, check=True,
+                       stdout=None if verbose else subprocess.DEVNULL)
+        with open(output, 'r') as f:
+            return json.load(f)
+
+
+def print_results(results):
+    print(f"{'cocktails':>9}  {'scenario':<12}{'fps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for size, result in results.items():
+        for scenario, summary in result['scenarios'].items():
+            print(f"{size:>9}  {scenario:<12}{summary['fps']:>9.0f}{summary['p50_ms']:>9.2f}"
+                  f"{summary['p95_ms']:>9.2f}{summary['p99_ms']:>9.2f}{summary['max_ms']:>9.2f}")
+        print(f"{size:>9}  startup {result['startup_ms']:.1f} ms, peak memory {result['peak_rss_mb']:.1f} MB")
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regressions of results against baseline."""
+    regressions = []
+
+    def check(label, value, old, floor=0.0):
+        if value > old * (1 + tolerance) and value - old > floor:
+            regressions.append(f"{label}: {old:.2f} -> {value:.2f}")
+
+    for size, result in results.items():
+        old = baseline.get(size)
+        if old is None:
+            continue
+        check(f"{size} cocktails startup ms", result['startup_ms'], old['startup_ms'], MIN_REGRESSION_MS)
+        check(f"{size} cocktails peak MB", result['peak_rss_mb'], old['peak_rss_mb'])
+        for scenario, summary in result['scenarios'].items():
+            if scenario in old['scenarios']:
+                check(f"{size} cocktails {scenario} p95 ms", summary['p95_ms'],
+                      old['scenarios'][scenario]['p95_ms'], MIN_REGRESSION_MS)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='comma-separated menu sizes')
+    parser.add_argument('--frames', type=int, default=300, help='frames per scenario')
+    parser.add_argument('--save-baseline', metavar='FILE', help='write the results as a baseline')
+    parser.add_argument('--baseline', metavar='FILE', help='compare against a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed growth over the baseline')
+    parser.add_argument('--verbose', action='store_true', help='show the kiosk output')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        run_worker(args.worker, args.frames, args.output)
+        return
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    results = {}
+    for size in (int(s) for s in args.sizes.split(',')):
+        print(f"Benchmarking {size} cocktails...")
+        results[str(size)] = run_size(size, args.frames, args.verbose)
+    print()
+    print_results(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,11 +3,14 @@ import json
 import os
 import sys
 import time
-from gpiozero import DigitalOutputDevice, Device
-from gpiozero.pins.lgpio import LGPIOFactory
-
-# Set lgpio as the default pin factory
-Device.pin_factory = LGPIOFactory()
+from concurrent.futures import ThreadPoolExecutor
+from pump_client import PumpClient, PumpDaemonError, RemoteDispenser
+from recipes import RecipeBook
+from render_cache import FrameCache, ImageCache, SpinnerSheet, TextCache
+from asset_cache import AssetCache
+import estop
+from frame_stats import FrameProfiler
+from tween import Animator, Tween, ease_out_cubic
 
 # Initialize Pygame with better error handling
 pygame.init()
@@ -17,7 +20,22 @@ SCREEN_WIDTH = 480   # Vertical orientation
 SCREEN_HEIGHT = 800
 FLOW_RATE = 150  # ml per minute
 TARGET_VOLUME = 300  # ml total per cocktail
-OZ_TO_ML = 29.5735  # 1 fluid ounce = 29.5735 ml
+FPS = 60  # Frame rate while something moves on screen
+SWIPE_DURATION_MS = 300  # Time for a released card to slide out or back
+IDLE_WAIT_MS = 250  # Longest the main loop sleeps waiting for input when idle
+FRAME_CACHE_SIZE = 4  # Pre-composited cocktail frames kept in memory (~1.5 MB each)
+IMAGE_BUDGET_MB = float(os.environ.get('MIXALOT_IMAGE_BUDGET_MB', 8))  # Drink images kept in memory (~0.8 MB each)
+SPINNER_STEPS = 36  # Pre-rotated spinner frames (10 degree steps, up to ~0.8 MB each)
+SPINNER_SPEED = 300  # Spinner rotation in degrees per second
+IMAGE_ROTATION = -90  # Images are drawn landscape and rotated for the vertical screen
+ASSET_CACHE_DIR = os.environ.get('MIXALOT_ASSET_CACHE',
+                                 os.path.expanduser('~/.cache/mix-a-lot/assets'))
+FRAME_STATS_FILE = os.environ.get('MIXALOT_FRAME_STATS',  # Empty to disable
+                                  os.path.expanduser('~/.cache/mix-a-lot/frame_stats.json'))
+FRAME_STATS_INTERVAL = 30  # Seconds between frame stats exports
+OVERLAY_KEY = pygame.K_F3  # Toggles the frame stats overlay
+ESTOP_EVENT = pygame.event.custom_type()  # Posted when any process triggered the emergency stop
+STARTUP_WORKERS = 4  # Threads decoding images while the pump daemon is reached
 
 # Colors
 BLACK = (0, 0, 0)
@@ -25,95 +43,178 @@ WHITE = (255, 255, 255)
 BLUE = (0, 123, 255)
 GREEN = (40, 167, 69)
 
-def animate_text_zoom(screen, base_text, position, start_size, target_size, duration=300, background=None, current_img=None, image_offset=0):
-    """Animate overlay text zooming from a small size to target size."""
-    clock = pygame.time.Clock()
-    start_time = pygame.time.get_ticks()
-    while True:
-        elapsed = pygame.time.get_ticks() - start_time
-        progress = min(elapsed / duration, 1.0)
-        current_size = int(start_size + (target_size - start_size) * progress)
-        font = pygame.font.SysFont(None, current_size)
-        text_surface = font.render(base_text, True, WHITE)
-        text_rect = text_surface.get_rect(center=position)
-        if background:
-            screen.blit(background, (0, 0))
-        if current_img:
-            screen.blit(current_img, (image_offset, 0))
-        screen.blit(text_surface, text_rect)
-        pygame.display.flip()
-        if progress >= 1.0:
-            break
-        clock.tick(60)
+# Screen layout
+IMAGE_Y = 50  # Leave space at top
+IMAGE_HEIGHT = int(SCREEN_HEIGHT * 0.6)  # Use 60% of screen height for images
+IMAGE_WIDTH = SCREEN_WIDTH - 40  # Leave 20px margin on each side
+IMAGE_BAND_RECT = pygame.Rect(0, IMAGE_Y, SCREEN_WIDTH, IMAGE_HEIGHT)  # Area a swipe changes
+STOP_BUTTON_RECT = pygame.Rect(20, SCREEN_HEIGHT - 100, SCREEN_WIDTH - 40, 80)
+OVERLAY_RECT = pygame.Rect(0, 0, SCREEN_WIDTH, 150)  # Frame stats overlay, top of the screen
 
-def show_mixing_animation(screen, duration_sec, background=None):
-    """Show mixing animation with rotating loading image."""
-    clock = pygame.time.Clock()
-    start_time = pygame.time.get_ticks()
-    angle = 0
-    
-    # Calculate sizes for vertical layout
-    loading_size = min(SCREEN_WIDTH - 40, int(SCREEN_HEIGHT * 0.4))  # 40px margin, 40% of height
-    
-    try:
-        # Load and rotate pouring image for vertical layout
-        pouring_img = pygame.image.load(os.path.join("drink_logos", "pouring.png"))
-        pouring_img = pygame.transform.rotate(pouring_img, -90)
-        pouring_img = pygame.transform.scale(pouring_img, (SCREEN_WIDTH, SCREEN_HEIGHT))
-        
-        # Load and prepare loading spinner
-        loading_img = pygame.image.load(os.path.join("drink_logos", "loading.png"))
-        loading_img = pygame.transform.scale(loading_img, (loading_size, loading_size))
-    except Exception as e:
-        print(f"Error loading animation images: {e}")
-        return
-
-    # Create progress text
-    font = pygame.font.SysFont(None, 48)
+# Fonts and rendered text shared by everything that draws
+text_cache = TextCache()
+
+def find_image_path(name):
+    """Path of the PNG for a cocktail, trying the usual spellings of its file name."""
+    image_path = os.path.join('drink_logos', f"{name}.png")
+    if not os.path.exists(image_path):
+        alternatives = [
+            name.replace('_', ' ').title().replace(' ', '_'),
+            name.capitalize()
+        ]
+        for alt_name in alternatives:
+            alt_path = os.path.join('drink_logos', f"{alt_name}.png")
+            if os.path.exists(alt_path):
+                return alt_path
+    return image_path
+
+def prepare_background(path):
+    """Load the background, rotated and scaled to fill the vertical screen."""
+    background = pygame.image.load(path)
+    background = pygame.transform.rotate(background, IMAGE_ROTATION)
+    background = pygame.transform.scale(background, (SCREEN_WIDTH, SCREEN_HEIGHT))
+    return background.convert()
+
+def prepare_drink_image(path):
+    """Load a drink image, rotated, scaled and centred on an IMAGE_WIDTH x IMAGE_HEIGHT surface."""
+    image = pygame.image.load(path)
+    # Rotate image for vertical orientation
+    image = pygame.transform.rotate(image, IMAGE_ROTATION)
+    # Scale while maintaining aspect ratio
+    img_rect = image.get_rect()
+    scale = min(IMAGE_WIDTH / img_rect.width, IMAGE_HEIGHT / img_rect.height)
+    new_size = (int(img_rect.width * scale), int(img_rect.height * scale))
+    image = pygame.transform.scale(image, new_size)
     
-    while True:
-        elapsed = pygame.time.get_ticks() - start_time
-        if elapsed >= duration_sec * 1000:
-            break
+    # Create a surface with the target size
+    final_surface = pygame.Surface((IMAGE_WIDTH, IMAGE_HEIGHT)).convert()
+    final_surface.fill(BLACK)
+    # Center the image on the surface
+    x = (IMAGE_WIDTH - new_size[0]) // 2
+    y = (IMAGE_HEIGHT - new_size[1]) // 2
+    final_surface.blit(image, (x, y))
+    return final_surface
+
+def show_splash():
+    """Show a minimal frame while the mixer starts up."""
+    screen.fill(BLACK)
+    text = text_cache.render("Mix-a-Lot", 72, WHITE)
+    screen.blit(text, text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 40)))
+    text = text_cache.render("Starting...", 36, WHITE)
+    screen.blit(text, text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 30)))
+    pygame.display.flip()
+
+class MixingAssets:
+    """Images for the mixing animation, loaded and prepared once at startup."""
+
+    def __init__(self):
+        self.pouring_img = None
+        self.spinner = None
+        # 40px margin, 40% of height
+        self.loading_size = min(SCREEN_WIDTH - 40, int(SCREEN_HEIGHT * 0.4))
+        
+        try:
+            # Load and rotate pouring image for vertical layout
+            pouring_img = pygame.image.load(os.path.join("drink_logos", "pouring.png"))
+            pouring_img = pygame.transform.rotate(pouring_img, IMAGE_ROTATION)
+            self.pouring_img = pygame.transform.scale(pouring_img, (SCREEN_WIDTH, SCREEN_HEIGHT))
+            
+            # Load the loading spinner and pre-rotate it into a sprite sheet
+            loading_img = pygame.image.load(os.path.join("drink_logos", "loading.png"))
+            loading_img = pygame.transform.scale(loading_img, (self.loading_size, self.loading_size))
+            self.spinner = SpinnerSheet(loading_img, SPINNER_STEPS)
+        except Exception as e:
+            print(f"Error loading animation images: {e}")
+
+class MixingAnimation:
+    """Pouring screen with a rotating spinner and the live pour percentage."""
+
+    def __init__(self, background=None, assets=None):
+        self.background = background
+        self.assets = assets or MixingAssets()
+        self.started = time.perf_counter()
         
-        # Calculate progress
-        progress = min(elapsed / (duration_sec * 1000), 1.0)
+        # Screen areas that change between frames: the spinner at any
+        # rotation and the progress text line
+        spinner_extent = int(self.assets.loading_size * 1.5)
+        self.spinner_rect = pygame.Rect(0, 0, spinner_extent, spinner_extent)
+        self.spinner_rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+        self.text_rect = pygame.Rect(0, SCREEN_HEIGHT - 180, SCREEN_WIDTH, 60)
+
+    def dirty_rects(self):
+        """Screen areas that change from one animation frame to the next."""
+        return [self.spinner_rect, self.text_rect]
+
+    def draw(self, screen, progress):
+        """Draw one animation frame for the given pour progress (0.0-1.0)."""
         progress_text = f"Mixing... {int(progress * 100)}%"
         
         # Clear screen
-        if background:
-            screen.blit(background, (0, 0))
+        if self.background:
+            screen.blit(self.background, (0, 0))
         else:
             screen.fill(BLACK)
         
         # Draw pouring animation
-        screen.blit(pouring_img, (0, 0))
+        if self.assets.pouring_img:
+            screen.blit(self.assets.pouring_img, (0, 0))
         
-        # Draw rotating loading spinner
-        angle = (angle + 5) % 360
-        rotated_loading = pygame.transform.rotate(loading_img, angle)
-        rotated_rect = rotated_loading.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
-        screen.blit(rotated_loading, rotated_rect)
+        # Draw rotating loading spinner from the pre-rotated sheet
+        if self.assets.spinner:
+            angle = (time.perf_counter() - self.started) * SPINNER_SPEED
+            self.assets.spinner.blit(screen, (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2), angle)
         
-        # Draw progress text
-        text = font.render(progress_text, True, WHITE)
-        text_rect = text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 100))
+        # Draw progress text above the emergency stop button
+        text = text_cache.render(progress_text, 48, WHITE)
+        text_rect = text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 150))
         screen.blit(text, text_rect)
-        
-        pygame.display.flip()
-        clock.tick(60)
 
 class CocktailMixer:
     def __init__(self):
-        self.load_configurations()
-        self.load_images()
+        started = time.perf_counter()
+        self.startup_times = {}  # Stage name -> seconds
+        self.timed('config', self.load_configurations)
+        self.recipes = RecipeBook('cocktails.json', 'pump_config.json', TARGET_VOLUME, FLOW_RATE)
+        self.timed('recipes', self.recipes.refresh)
+        self.frames = FrameCache(self.compose_frame, FRAME_CACHE_SIZE)
         self.current_cocktail = 0
         self.mixing = False
-        self.start_x = 0
+        self.mixing_animation = None
+        self.profiler = FrameProfiler(FRAME_STATS_FILE, FRAME_STATS_INTERVAL)
+        self.overlay_font = None
+        self.last_frame = None  # What the screen showed after the last draw()
+        self.full_redraw = True  # Repaint everything on the next draw()
+        self.stop_button_rect = STOP_BUTTON_RECT
+        self.animator = Animator()
+        self.offset = 0  # Horizontal position of the image band while dragged or swiped
         self.dragging = False
-        self.drag_offset = 0
-        self.pumps = {}
-        self.setup_pumps()
+        self.drag_start_x = 0
+        self.drag_base = 0  # Band offset when the current touch began
+        
+        # Decode images on a worker pool while the pump daemon is reached
+        pool = ThreadPoolExecutor(STARTUP_WORKERS, thread_name_prefix='startup')
+        try:
+            images = self.load_images(pool)
+            # Not needed until the first pour, so the menu does not wait for it
+            self.mixing_assets_loading = pool.submit(self.timed, 'animation', MixingAssets)
+            self.mixing_assets_loading.add_done_callback(
+                lambda _: print(f"Startup: animation {self.startup_times['animation'] * 1000:.1f} ms"))
+            self.timed('pumps', self.connect_pumps)
+            self.finish_images(images)
+        finally:
+            pool.shutdown(wait=False)
+        
+        self.startup_times['total'] = time.perf_counter() - started
+        print("Startup: " + ", ".join(f"{name} {seconds * 1000:.1f} ms"
+                                      for name, seconds in self.startup_times.items()))
+
+    def timed(self, stage, function, *args):
+        """Run function(*args) and record its duration as a startup stage."""
+        started = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self.startup_times[stage] = time.perf_counter() - started
         
     def load_configurations(self):
         # Load cocktails
@@ -124,96 +225,94 @@ class CocktailMixer:
         with open('pump_config.json', 'r') as f:
             self.pump_config = json.load(f)
             
-    def load_images(self):
-        self.images = []
+    def load_images(self, pool):
+        """Start loading the background and the first screen's drink images on pool.
+
+        Returns the pending loads for finish_images().
+        """
         self.background = None
+        self.frames.invalidate()
+        self.images_started = time.perf_counter()
+        self.assets = AssetCache(ASSET_CACHE_DIR, (SCREEN_WIDTH, SCREEN_HEIGHT), IMAGE_ROTATION)
         
-        # Calculate image dimensions for vertical layout
-        image_height = int(SCREEN_HEIGHT * 0.6)  # Use 60% of screen height for images
-        image_width = SCREEN_WIDTH - 40  # Leave 20px margin on each side
-        
-        # Load background
+        # Drink images are loaded on demand; only the first screen waits for them
+        self.images = ImageCache(self.load_drink_image, IMAGE_BUDGET_MB * 1024 * 1024)
+        background = pool.submit(self.assets.load, os.path.join("drink_logos", "tipsy.png"),
+                                 'background', prepare_background)
+        drinks = [(index, pool.submit(self.load_drink_image, index))
+                  for index in self.neighbours(0)]
+        return background, drinks
+
+    def finish_images(self, pending):
+        """Wait for the loads started by load_images()."""
+        background, drinks = pending
         try:
-            self.background = pygame.image.load(os.path.join("drink_logos", "tipsy.png"))
-            # Rotate and scale background for vertical orientation
-            self.background = pygame.transform.rotate(self.background, -90)
-            self.background = pygame.transform.scale(self.background, (SCREEN_WIDTH, SCREEN_HEIGHT))
+            self.background = background.result()
         except Exception as e:
             print(f"Error loading background: {e}")
         
-        # Load drink images
-        for cocktail in self.cocktails:
-            name = cocktail['normal_name'].lower().replace(' ', '_')
-            try:
-                image_path = os.path.join('drink_logos', f"{name}.png")
-                if not os.path.exists(image_path):
-                    alternatives = [
-                        name.replace('_', ' ').title().replace(' ', '_'),
-                        name.capitalize()
-                    ]
-                    for alt_name in alternatives:
-                        alt_path = os.path.join('drink_logos', f"{alt_name}.png")
-                        if os.path.exists(alt_path):
-                            image_path = alt_path
-                            break
-                
-                # Load and process image
-                image = pygame.image.load(image_path)
-                # Rotate image for vertical orientation
-                image = pygame.transform.rotate(image, -90)
-                # Scale while maintaining aspect ratio
-                img_rect = image.get_rect()
-                scale = min(image_width / img_rect.width, image_height / img_rect.height)
-                new_size = (int(img_rect.width * scale), int(img_rect.height * scale))
-                image = pygame.transform.scale(image, new_size)
-                
-                # Create a surface with the target size
-                final_surface = pygame.Surface((image_width, image_height))
-                final_surface.fill(BLACK)
-                # Center the image on the surface
-                x = (image_width - new_size[0]) // 2
-                y = (image_height - new_size[1]) // 2
-                final_surface.blit(image, (x, y))
-                
-                self.images.append((final_surface, cocktail['normal_name']))
-            except Exception as e:
-                print(f"Could not load image for {name}: {e}")
-                # Create a placeholder
-                placeholder = pygame.Surface((image_width, image_height))
-                placeholder.fill(BLUE)
-                self.images.append((placeholder, cocktail['normal_name']))
-
-    def setup_pumps(self):
-        for pump_name, ingredient in self.pump_config.items():
-            pump_num = int(pump_name.split()[1])
-            gpio_pin = self.get_gpio_pin(pump_num)
-            if gpio_pin:
-                self.pumps[ingredient.lower()] = DigitalOutputDevice(gpio_pin)
-
-    def get_gpio_pin(self, pump_num):
-        pump_to_gpio = {
-            1: 27, 2: 17, 3: 18, 4: 23, 5: 5, 6: 6, 7: 13,
-            8: 19, 9: 20, 10: 21
-        }
-        return pump_to_gpio.get(pump_num)
-
-    def animate_swipe(self, direction, duration=300):
-        """Animate smooth swipe transition."""
-        start_time = pygame.time.get_ticks()
-        start_offset = self.drag_offset
-        target_offset = SCREEN_WIDTH if direction > 0 else -SCREEN_WIDTH
-        
-        while True:
-            elapsed = pygame.time.get_ticks() - start_time
-            progress = min(elapsed / duration, 1.0)
-            current_offset = start_offset + (target_offset - start_offset) * progress
-            
-            self.draw(current_offset)
-            
-            if progress >= 1.0:
-                break
-            
-            pygame.time.Clock().tick(60)
+        for index, drink in drinks:
+            self.images.put(index, drink.result())
+        self.images.focus(self.neighbours(0))
+        
+        self.startup_times['images'] = time.perf_counter() - self.images_started
+        self.assets.report_startup(self.startup_times['images'])
+
+    def load_drink_image(self, index):
+        """Load the image for one cocktail, or a placeholder if it cannot be read."""
+        name = self.cocktails[index]['normal_name'].lower().replace(' ', '_')
+        try:
+            return self.assets.load(find_image_path(name), 'drink', prepare_drink_image)
+        except Exception as e:
+            print(f"Could not load image for {name}: {e}")
+            # Create a placeholder
+            placeholder = pygame.Surface((IMAGE_WIDTH, IMAGE_HEIGHT))
+            placeholder.fill(BLUE)
+            return placeholder
+
+    def neighbours(self, index):
+        """The cocktail at index and the ones a swipe can bring on screen."""
+        count = len(self.cocktails)
+        return [index, (index + 1) % count, (index - 1) % count]
+
+    def connect_pumps(self):
+        """Connect to the pump daemon, which owns the pins (pumpen.json's pin map)."""
+        self.pumpd = PumpClient(on_event=self.on_pump_event)
+        if not self.pumpd.connected:
+            print(f"Pump daemon not running ({self.pumpd.path}), retrying in the background")
+        self.dispenser = RemoteDispenser(self.pumpd)
+
+    def on_pump_event(self, event, data):
+        """Called on the pump client's thread for every daemon event."""
+        if event == 'estop':
+            pygame.event.post(pygame.event.Event(ESTOP_EVENT, source=data.get('source')))
+
+    def advance(self, direction):
+        """Make the previous (direction 1) or next (direction -1) cocktail current."""
+        self.current_cocktail = (self.current_cocktail - direction) % len(self.cocktails)
+        self.images.focus(self.neighbours(self.current_cocktail))
+
+    def start_swipe(self, direction):
+        """Slide the image band out (direction 1 or -1), or back to rest (0)."""
+        target = direction * SCREEN_WIDTH
+        
+        def finished(tween):
+            if direction:
+                self.advance(direction)
+            self.offset = 0
+        
+        self.animator.start('swipe', Tween(self.offset, target, SWIPE_DURATION_MS,
+                                           ease_out_cubic, finished))
+
+    def catch_swipe(self):
+        """Stop a running swipe where it is so a new touch can take over."""
+        tween = self.animator.cancel('swipe')
+        if tween is None or tween.end == 0:
+            return
+        # The card was on its way out: commit the change and keep the new
+        # card where it currently is on screen
+        self.advance(1 if tween.end > 0 else -1)
+        self.offset -= tween.end
 
     def mix_cocktail(self):
         if self.mixing:
@@ -222,84 +321,195 @@ class CocktailMixer:
         self.mixing = True
         cocktail = self.cocktails[self.current_cocktail]
         
-        # Show mixing animation
-        show_mixing_animation(screen, 10, self.background)
+        # The mixing animation runs alongside the pour, driven by its progress
+        self.mixing_animation = MixingAnimation(self.background, self.mixing_assets_loading.result())
         
-        # Calculate and run pumps
-        for ingredient, amount in cocktail['ingredients'].items():
-            if 'dash' not in amount.lower():
-                oz = float(amount.split()[0])
-                ml = oz * OZ_TO_ML
-                
-                ingredient_lower = ingredient.lower()
-                if ingredient_lower in self.pumps:
-                    pump = self.pumps[ingredient_lower]
-                    duration = (ml / FLOW_RATE) * 60
-                    
-                    pump.on()
-                    time.sleep(duration)
-                    pump.off()
+        # Pump run times come precompiled from the recipe book
+        plan = self.recipes.get(cocktail['normal_name'])
+        if plan is None:
+            print(f"No dose plan for {cocktail['normal_name']}")
+            self.mixing = False
+            self.mixing_animation = None
+            return
+        # "Pump 3" in pump_config.json is pump id 3 in pumpen.json
+        jobs = [{'name': step.ingredient, 'pump_id': int(step.pump_name.split()[1]), 'duration': step.duration,
+                 'direction': step.direction}
+                for step in plan.steps]
         
-        self.mixing = False
+        # The daemon pours; update() clears self.mixing when it is done
+        self.dispenser.submit(cocktail['normal_name'], jobs)
 
-    def draw(self, offset=0):
-        if self.background:
-            screen.blit(self.background, (0, 0))
+    def update(self):
+        """Advance animations and handle progress reported by the dispense worker.
+
+        Call once per frame.
+        """
+        self.animator.update(pygame.time.get_ticks())
+        swipe = self.animator.get('swipe')
+        if swipe:
+            self.offset = round(swipe.value)
+        
+        for event in self.dispenser.poll():
+            kind, name = event[0], event[1]
+            if kind == 'finished':
+                event[2].report()
+                self.mixing = False
+                self.mixing_animation = None
+            elif kind == 'skipped':
+                print(f"  ! No pump for {event[2]['name']}: {event[2]['reason']}")
+            elif kind == 'error':
+                print(f"Error pouring {name}: {event[2]}")
+                self.mixing = False
+                self.mixing_animation = None
+
+    def is_animating(self):
+        """True while the screen changes without input (drag, swipe or pour in progress)."""
+        return self.dragging or self.mixing or self.animator.busy
+
+    def invalidate(self):
+        """Make the next draw() repaint the whole screen."""
+        self.full_redraw = True
+
+    def dirty_rects(self, offset):
+        """Return the screen areas that changed since the last draw(), if any."""
+        if self.mixing and self.mixing_animation:
+            frame = ('mixing',)
         else:
-            screen.fill(BLACK)
+            frame = ('menu', self.current_cocktail, offset)
+        last_frame, self.last_frame = self.last_frame, frame
+        
+        if self.full_redraw or last_frame is None or frame[:2] != last_frame[:2]:
+            self.full_redraw = False
+            return [screen.get_rect()]
+        if frame[0] == 'mixing':
+            return self.mixing_animation.dirty_rects()
+        if frame != last_frame:
+            return [IMAGE_BAND_RECT]  # Only the swipe offset changed
+        return []
+
+    def draw(self, offset=0):
+        """Repaint what changed and push only those areas to the display."""
+        dirty = self.dirty_rects(offset)
+        if not dirty:
+            self.prefetch_frames()
+        if self.profiler.overlay:
+            dirty.append(OVERLAY_RECT)  # The numbers change every frame
+        if not dirty:
+            self.profiler.rendered()  # Nothing to show; the screen is already current
+            return self.stop_button_rect
         
-        # Draw current cocktail
-        current_img, current_name = self.images[self.current_cocktail]
-        # Calculate image position to center in the top portion
-        img_y = 50  # Leave space at top
-        screen.blit(current_img, (offset, img_y))
+        started = time.perf_counter()
+        for rect in dirty:
+            # Blits are clipped to the dirty area, so unchanged pixels cost nothing
+            screen.set_clip(rect)
+            self.paint(offset)
+        screen.set_clip(None)
+        if self.profiler.overlay:
+            self.draw_overlay()
         
-        # Draw adjacent cocktails if dragging
+        with self.profiler.measure('flip'):
+            if dirty[0] == screen.get_rect():
+                pygame.display.flip()
+            else:
+                pygame.display.update(dirty)
+        self.profiler.record('frame', time.perf_counter() - started)
+        self.profiler.rendered()
+        return self.stop_button_rect  # Return the stop button rect for click detection
+
+    def draw_overlay(self):
+        """Draw the frame stats overlay on top of the screen."""
+        if self.overlay_font is None:
+            self.overlay_font = pygame.font.SysFont('monospace', 18)
+        self.profiler.draw_overlay(screen, self.overlay_font, OVERLAY_RECT)
+
+    def toggle_overlay(self):
+        if not self.profiler.toggle_overlay():
+            self.invalidate()  # Paint the scene back over the overlay
+
+    def paint(self, offset=0):
+        """Paint the whole scene to the screen surface (no display update)."""
+        if self.mixing and self.mixing_animation:
+            progress, _ = self.dispenser.progress()
+            self.mixing_animation.draw(screen, progress)
+            self.draw_stop_button(screen)
+            return
+        
+        frame = self.frames.get(self.current_cocktail)
+        if offset == 0:
+            screen.blit(frame, (0, 0))
+            return
+        
+        # Swipe: slide the image band of the current and the adjacent frame.
+        # The static parts only need painting if the clip reaches past the band.
+        if not IMAGE_BAND_RECT.contains(screen.get_clip()):
+            screen.blit(frame, (0, 0))
+        screen.blit(frame, (offset, IMAGE_Y), IMAGE_BAND_RECT)
         if offset < 0:
-            next_idx = (self.current_cocktail + 1) % len(self.images)
-            next_img, _ = self.images[next_idx]
-            screen.blit(next_img, (SCREEN_WIDTH + offset, img_y))
-        elif offset > 0:
-            prev_idx = (self.current_cocktail - 1) % len(self.images)
-            prev_img, _ = self.images[prev_idx]
-            screen.blit(prev_img, (-SCREEN_WIDTH + offset, img_y))
+            next_idx = (self.current_cocktail + 1) % len(self.cocktails)
+            screen.blit(self.frames.get(next_idx), (SCREEN_WIDTH + offset, IMAGE_Y), IMAGE_BAND_RECT)
+        else:
+            prev_idx = (self.current_cocktail - 1) % len(self.cocktails)
+            screen.blit(self.frames.get(prev_idx), (-SCREEN_WIDTH + offset, IMAGE_Y), IMAGE_BAND_RECT)
+
+    def compose_frame(self, index):
+        """Build the static screen for one cocktail: background, image, name and button."""
+        frame = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+        if self.background:
+            frame.blit(self.background, (0, 0))
+        else:
+            frame.fill(BLACK)
+        
+        # Draw the cocktail
+        name = self.cocktails[index]['normal_name']
+        frame.blit(self.images.get(index), (0, IMAGE_Y))
         
         # Draw cocktail name
-        font = pygame.font.SysFont(None, 48)
-        text = font.render(current_name, True, WHITE)
+        text = text_cache.render(name, 48, WHITE)
         text_rect = text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT - 150))
-        screen.blit(text, text_rect)
+        frame.blit(text, text_rect)
         
-        # Draw emergency stop button
-        stop_button_rect = pygame.Rect(20, SCREEN_HEIGHT - 100, SCREEN_WIDTH - 40, 80)
+        self.draw_stop_button(frame)
+        return frame
+
+    def prefetch_frames(self):
+        """Build a missing neighbour frame so the next swipe never waits. Call when idle."""
+        # Frames whose image is still loading in the background are built later
+        neighbours = [i for i in self.neighbours(self.current_cocktail) if self.images.ready(i)]
+        return self.frames.prefetch(neighbours)
+
+    def draw_stop_button(self, surface):
+        """Draw the emergency stop button onto surface."""
+        stop_button_rect = self.stop_button_rect
         # Draw button shadow
         shadow_rect = stop_button_rect.copy()
         shadow_rect.y += 4
-        pygame.draw.rect(screen, (100, 0, 0), shadow_rect, border_radius=10)
+        pygame.draw.rect(surface, (100, 0, 0), shadow_rect, border_radius=10)
         # Draw main button
-        pygame.draw.rect(screen, (200, 0, 0), stop_button_rect, border_radius=10)
-        pygame.draw.rect(screen, (255, 0, 0), stop_button_rect.inflate(-4, -4), border_radius=10)
+        pygame.draw.rect(surface, (200, 0, 0), stop_button_rect, border_radius=10)
+        pygame.draw.rect(surface, (255, 0, 0), stop_button_rect.inflate(-4, -4), border_radius=10)
         
         # Draw stop icon and text
-        font = pygame.font.SysFont(None, 36)
-        stop_text = font.render("EMERGENCY STOP", True, WHITE)
+        stop_text = text_cache.render("EMERGENCY STOP", 36, WHITE)
         stop_text_rect = stop_text.get_rect(center=stop_button_rect.center)
-        screen.blit(stop_text, stop_text_rect)
-        
-        pygame.display.flip()
-        
-        return stop_button_rect  # Return the stop button rect for click detection
+        surface.blit(stop_text, stop_text_rect)
 
     def emergency_stop(self):
-        """Stop all pumps immediately"""
-        print("EMERGENCY STOP - Stopping all pumps")
-        for pump in self.pumps.values():
-            pump.off()
+        """Stop all pumps immediately; the daemon reports the stop back (ESTOP_EVENT)"""
+        try:
+            self.dispenser.stop('kiosk')
+        except PumpDaemonError as e:
+            # The daemon's e-stop socket may still answer when this connection does not
+            print(f"EMERGENCY STOP through the pump daemon failed: {e}")
+            estop.broadcast('kiosk')
+            pygame.event.post(pygame.event.Event(ESTOP_EVENT, source='kiosk'))
+
+    def show_emergency_stop(self):
+        """Leave the mixing screen and show the emergency stop message"""
         self.mixing = False
+        self.mixing_animation = None
         
         # Show emergency stop message
-        font = pygame.font.SysFont(None, 72)
-        text = font.render("EMERGENCY STOP", True, WHITE)
+        text = text_cache.render("EMERGENCY STOP", 72, WHITE)
         text_rect = text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2))
         
         overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
@@ -312,36 +522,40 @@ class CocktailMixer:
         
         # Wait a moment to show the message
         pygame.time.wait(2000)
+        self.invalidate()
 
     def handle_event(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN:
             # Check for emergency stop button click
-            stop_button_rect = self.draw()  # Get the current stop button rect
-            if stop_button_rect.collidepoint(event.pos):
+            if self.stop_button_rect.collidepoint(event.pos):
                 self.emergency_stop()
                 return
+            
+            # Only the stop button reacts while a drink is pouring
+            if self.mixing:
+                return
                 
+            self.catch_swipe()
             self.dragging = True
-            self.start_x = event.pos[0]
+            self.drag_start_x = event.pos[0]
+            self.drag_base = self.offset
             
         elif event.type == pygame.MOUSEMOTION and self.dragging:
-            self.drag_offset = event.pos[0] - self.start_x
+            offset = self.drag_base + event.pos[0] - self.drag_start_x
+            self.offset = max(-SCREEN_WIDTH, min(SCREEN_WIDTH, offset))
             
         elif event.type == pygame.MOUSEBUTTONUP and self.dragging:
-            # Handle click vs swipe
-            if abs(self.drag_offset) < 50:  # Click
-                if not self.mixing:
-                    self.mix_cocktail()
-            else:  # Swipe
-                if abs(self.drag_offset) > SCREEN_WIDTH / 3:
-                    direction = 1 if self.drag_offset > 0 else -1
-                    self.animate_swipe(direction)
-                    self.current_cocktail = (self.current_cocktail - direction) % len(self.images)
-                else:
-                    self.animate_swipe(0)  # Snap back
-            
             self.dragging = False
-            self.drag_offset = 0
+            # Handle click vs swipe; only a card at rest can be clicked
+            if abs(event.pos[0] - self.drag_start_x) < 50 and self.drag_base == 0:  # Click
+                self.offset = 0
+                if not self.mixing:
+                    with self.profiler.measure('mix_cocktail'):
+                        self.mix_cocktail()
+            elif abs(self.offset) > SCREEN_WIDTH / 3:  # Swipe
+                self.start_swipe(1 if self.offset > 0 else -1)
+            else:
+                self.start_swipe(0)  # Snap back
 
 def init_display():
     """Initialize the display for Raspberry Pi"""
@@ -392,27 +606,59 @@ def init_display():
         print("3. You have permission to access the X server")
         sys.exit(1)
 
+def handle_events(mixer, events, received):
+    """Dispatch one frame's input events; returns False when the kiosk should exit.
+
+    received is the perf_counter() time the events were taken from the queue.
+    """
+    running = True
+    for event in events:
+        if event.type == pygame.NOEVENT:
+            continue
+        elif event.type == pygame.QUIT:
+            running = False
+        elif event.type == pygame.KEYDOWN:
+            mixer.profiler.input_received(received)
+            if event.key == pygame.K_ESCAPE:
+                running = False
+            elif event.key == OVERLAY_KEY:
+                mixer.toggle_overlay()
+        elif event.type == ESTOP_EVENT:
+            mixer.show_emergency_stop()
+        else:
+            if event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION):
+                mixer.profiler.input_received(received)
+            mixer.handle_event(event)
+    return running
+
 def main():
     global screen
     screen = init_display()
     
+    show_splash()
     mixer = CocktailMixer()
     clock = pygame.time.Clock()
     running = True
     
     while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
-                    running = False
-            else:
-                mixer.handle_event(event)
+        if mixer.is_animating():
+            events = pygame.event.get()
+        else:
+            # Nothing moves on screen: sleep until input arrives instead of polling
+            events = [pygame.event.wait(IDLE_WAIT_MS)] + pygame.event.get()
+        running = handle_events(mixer, events, time.perf_counter())
         
-        mixer.draw(mixer.drag_offset if mixer.dragging else 0)
-        clock.tick(60)
+        mixer.update()
+        mixer.draw(mixer.offset)
+        mixer.profiler.maybe_export()
+        clock.tick(FPS)
     
+    mixer.dispenser.shutdown()
+    mixer.images.close()
+    mixer.profiler.export()
+    print(f"Frame stats: {json.dumps(mixer.profiler.summary(), indent=2)}")
+    print(f"Text cache: {text_cache.stats()}")
+    print(f"Image cache: {mixer.images.stats()}")
     pygame.quit()
 
 if __name__ == '__main__':
@@ -0,0 +1,141 @@
+"""Shared, cached access to the pump configuration file (pumpen.json).
+
+The parsed configuration is kept in memory and only re-read when the
+file's inode, size or mtime changes. Writes go to a temporary file that
+is renamed over the original, so readers never see a half-written file.
+"""
+import copy
+import json
+import os
+import tempfile
+import threading
+
+DEFAULT_MAX_PARALLEL_PUMPS = 1  # Without safety.max_parallel_pumps, assume the weakest power supply
+
+
+def file_signature(path):
+    """Cheap change detector for a file: (inode, size, mtime)."""
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def validate_config(config, filename):
+    """Return None if config is a usable pump configuration, else an error message."""
+    if not isinstance(config, dict) or not isinstance(config.get('pumps'), list):
+        return f"'{filename}' does not contain a valid 'pumps' array."
+    seen = set()
+    for index, pump in enumerate(config['pumps']):
+        if not isinstance(pump, dict):
+            return f"Entry {index} in '{filename}' is not an object."
+        for key in ('id', 'gpio_pin', 'direction_pin'):
+            if key not in pump:
+                return f"Pump entry {index} in '{filename}' is missing '{key}'."
+        if pump['id'] in seen:
+            return f"Pump id {pump['id']} appears twice in '{filename}'."
+        seen.add(pump['id'])
+    limit = (config.get('safety') or {}).get('max_parallel_pumps', DEFAULT_MAX_PARALLEL_PUMPS)
+    if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+        return f"'safety.max_parallel_pumps' in '{filename}' must be a whole number of at least 1."
+    return None
+
+
+class ConfigStore:
+    """In-memory copy of a pump configuration file that follows the file on disk."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._lock = threading.RLock()
+        self._signature = None
+        self._config = None
+        self._pumps_by_id = {}
+
+    def _reload_if_changed(self):
+        """Re-read the file if it changed. Must be called with the lock held."""
+        try:
+            signature = file_signature(self.filename)
+        except FileNotFoundError:
+            print(f"Error: Configuration file '{self.filename}' not found.")
+            return
+        if signature == self._signature:
+            return
+
+        try:
+            with open(self.filename, 'r') as f:
+                config = json.load(f)
+        except json.JSONDecodeError:
+            print(f"Error: Configuration file '{self.filename}' is not valid JSON.")
+            return
+        except Exception as e:
+            print(f"An unexpected error occurred while loading the configuration: {e}")
+            return
+        error = validate_config(config, self.filename)
+        if error:
+            print(f"Error: {error}")
+            return
+
+        self._install(config, signature)
+
+    def _install(self, config, signature):
+        self._config = config
+        self._pumps_by_id = {pump['id']: pump for pump in config['pumps']}
+        self._signature = signature
+
+    def config(self):
+        """The whole configuration dict, or None if it could never be loaded.
+
+        The returned object is shared; treat it as read-only and use
+        update() to change it.
+        """
+        with self._lock:
+            self._reload_if_changed()
+            return self._config
+
+    def pumps(self):
+        """The list of pump entries, or None if the configuration is unavailable."""
+        config = self.config()
+        return config['pumps'] if config else None
+
+    def max_parallel_pumps(self):
+        """Pumps the power supply can run at once (safety.max_parallel_pumps)."""
+        config = self.config()
+        if not config:
+            return DEFAULT_MAX_PARALLEL_PUMPS
+        return (config.get('safety') or {}).get('max_parallel_pumps', DEFAULT_MAX_PARALLEL_PUMPS)
+
+    def get_pump(self, pump_id):
+        """The entry for one pump id, or None."""
+        with self._lock:
+            self._reload_if_changed()
+            return self._pumps_by_id.get(pump_id)
+
+    def update(self, change):
+        """Apply change(config) to a copy of the configuration and save it atomically.
+
+        change may raise to abort; nothing is written then. Returns whatever
+        change returned.
+        """
+        with self._lock:
+            self._reload_if_changed()
+            if self._config is None:
+                raise ValueError(f"Configuration file '{self.filename}' could not be loaded")
+            config = copy.deepcopy(self._config)
+            result = change(config)
+            error = validate_config(config, self.filename)
+            if error:
+                raise ValueError(error)
+
+            directory = os.path.dirname(os.path.abspath(self.filename))
+            fd, temp_path = tempfile.mkstemp(prefix='.pumpen-', suffix='.json', dir=directory)
+            try:
+                os.chmod(temp_path, os.stat(self.filename).st_mode & 0o777)
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(config, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.filename)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+            self._install(config, file_signature(self.filename))
+            return result
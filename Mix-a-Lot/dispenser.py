@@ -0,0 +1,298 @@
+"""Parallel pump dispensing for the Mix-a-Lot cocktail machine."""
+import heapq
+import threading
+import time
+
+from pump_pool import SLOT_POLL_SECONDS
+from pump_timing import EdgeTimer
+
+# Orders in which a PumpScheduler hands out ingredient jobs
+SCHEDULING_POLICIES = ('longest_first', 'shortest_first', 'recipe_order')
+
+
+class PumpJob:
+    """One ingredient pour: the pump to run and how long it has to run."""
+
+    def __init__(self, name, pump, duration):
+        self.name = name
+        self.pump = pump
+        self.duration = duration
+        self.planned_start = 0.0  # Seconds after pour start, set by PumpScheduler
+        self.deadline_ns = None   # monotonic_ns at which the pump has to go off
+        self.started_at = None
+        self.stopped_at = None
+
+    @property
+    def done(self):
+        return self.stopped_at is not None
+
+    @property
+    def actual_duration(self):
+        """Seconds the pump was really on, or None if it has not stopped yet."""
+        if self.started_at is None or self.stopped_at is None:
+            return None
+        return self.stopped_at - self.started_at
+
+    def progress(self, now):
+        """Fraction (0.0-1.0) of this pour that has run at time now."""
+        if self.done:
+            return 1.0
+        if self.started_at is None or self.duration <= 0:
+            return 0.0
+        return min((now - self.started_at) / self.duration, 1.0)
+
+
+class DispenseResult:
+    """Outcome of a pour with per-pump timings."""
+
+    def __init__(self, jobs, started_at, finished_at, stopped=False):
+        self.jobs = jobs
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.stopped = stopped  # True if the pour was cut by an emergency stop
+
+    @property
+    def elapsed(self):
+        """Wall-clock seconds from the first pump on to the last pump off."""
+        return self.finished_at - self.started_at
+
+    @property
+    def planned(self):
+        """Seconds the pour should take according to the schedule."""
+        return max((job.planned_start + job.duration for job in self.jobs), default=0.0)
+
+    @property
+    def serial(self):
+        """Seconds the same pour would take one ingredient after another."""
+        return sum(job.duration for job in self.jobs)
+
+    def to_dict(self):
+        """The result as plain data, e.g. to send it to another process."""
+        return {
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'stopped': self.stopped,
+            'jobs': [{'name': job.name, 'duration': job.duration, 'planned_start': job.planned_start,
+                      'started_at': job.started_at, 'stopped_at': job.stopped_at}
+                     for job in self.jobs],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a result sent with to_dict(); its jobs have no pump device."""
+        jobs = []
+        for item in data['jobs']:
+            job = PumpJob(item['name'], None, item['duration'])
+            job.planned_start = item['planned_start']
+            job.started_at = item['started_at']
+            job.stopped_at = item['stopped_at']
+            jobs.append(job)
+        return cls(jobs, data['started_at'], data['finished_at'], data['stopped'])
+
+    def report(self):
+        """Print a short summary of the pour."""
+        if self.stopped:
+            print(f"Pour STOPPED after {self.elapsed:.2f}s")
+            return
+        print(f"Pour finished in {self.elapsed:.2f}s "
+              f"(planned {self.planned:.2f}s, serial would be {self.serial:.2f}s, "
+              f"max run-time error {self.max_error() * 1000:.2f} ms)")
+        for name, planned_start, planned_end, actual_start, actual_end in self.timeline():
+            if actual_start is None:
+                actual_text = "not run"
+            else:
+                actual_text = f"{actual_start:.2f}-{actual_end:.2f}s"
+            print(f"  - {name}: planned {planned_start:.2f}-{planned_end:.2f}s, actual {actual_text}")
+
+    def max_error(self):
+        """Largest absolute run-time error of any pump in seconds (over/underpour)."""
+        errors = [abs(job.actual_duration - job.duration)
+                  for job in self.jobs if job.actual_duration is not None]
+        return max(errors, default=0.0)
+
+    def timeline(self):
+        """Planned vs actual (start, end) of every pump, in seconds from pour start.
+
+        Returns a list of (name, planned_start, planned_end, actual_start,
+        actual_end); the actual values are None for pumps that never ran.
+        """
+        rows = []
+        for job in sorted(self.jobs, key=lambda job: job.planned_start):
+            actual_start = actual_end = None
+            if job.started_at is not None:
+                actual_start = job.started_at - self.started_at
+                actual_end = job.stopped_at - self.started_at
+            rows.append((job.name, job.planned_start, job.planned_start + job.duration,
+                         actual_start, actual_end))
+        return rows
+
+
+class PumpScheduler:
+    """Plans which pumps run when, with at most max_parallel running at once.
+
+    Jobs are handed out in policy order to whichever slot frees up first
+    (list scheduling). 'longest_first' keeps the total pour time short by
+    starting the long ingredients early and filling the gaps with short
+    ones. max_parallel=None means no limit: every pump starts at once.
+    """
+
+    def __init__(self, max_parallel=None, policy='longest_first'):
+        if policy not in SCHEDULING_POLICIES:
+            raise ValueError(f"Unknown scheduling policy '{policy}'")
+        if max_parallel is not None and max_parallel < 1:
+            raise ValueError("max_parallel must be at least 1")
+        self.max_parallel = max_parallel
+        self.policy = policy
+
+    def order(self, jobs):
+        """Return jobs in the order they should be started."""
+        if self.policy == 'longest_first':
+            return sorted(jobs, key=lambda job: job.duration, reverse=True)
+        if self.policy == 'shortest_first':
+            return sorted(jobs, key=lambda job: job.duration)
+        return list(jobs)
+
+    def plan(self, jobs):
+        """Set planned_start on every job and return them in start order."""
+        ordered = self.order(jobs)
+        slots = len(ordered) if self.max_parallel is None else self.max_parallel
+        free_at = [0.0] * max(min(slots, len(ordered)), 1)  # Min-heap of slot free times
+        for job in ordered:
+            job.planned_start = heapq.heappop(free_at)
+            heapq.heappush(free_at, job.planned_start + job.duration)
+        return ordered
+
+
+class DispenseEngine:
+    """Runs the pumps of a pour concurrently and stops each at its own deadline.
+
+    How many pumps may run at the same time is decided by the scheduler;
+    whenever a pump stops, the next planned job takes its slot.
+    """
+
+    def __init__(self, scheduler=None, timer=None):
+        self.scheduler = scheduler or PumpScheduler()
+        self.timer = timer or EdgeTimer()
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._active_jobs = []
+        self._epoch = 0  # Bumped by every stop() so queued pours can be cancelled
+        self.last_stop_latency = None  # Seconds from stop() call to all pumps off
+
+    @property
+    def epoch(self):
+        return self._epoch
+
+    def dispense(self, jobs, on_job_done=None, epoch=None, slots=None):
+        """Pour all jobs according to the schedule and return a DispenseResult.
+
+        Blocks until the last pump is off or stop() is called from another
+        thread. on_job_done(job) is called as each pump finishes. If epoch
+        is given and a stop() happened since it was read, nothing is poured.
+        slots (a pump_pool.PumpSlots shared with other commands) must grant
+        every pump a slot before it goes on; a job without one waits.
+        """
+        jobs = self.scheduler.plan([job for job in jobs if job.duration > 0])
+        clock = self.timer.clock
+        started_at = clock.monotonic()
+        with self._lock:
+            if epoch is not None and epoch != self._epoch:
+                return DispenseResult(jobs, started_at, started_at, stopped=True)
+            self._stop_event.clear()
+            self._active_jobs = jobs
+        if not jobs:
+            return DispenseResult(jobs, started_at, started_at)
+
+        limit = self.scheduler.max_parallel or len(jobs)
+        waiting = list(jobs)
+        running = []
+        held = 0  # Shared slots this pour holds, one per running pump
+        slot_free_ns = self.timer.now_ns()  # When the slot being filled became free
+        try:
+            while waiting or running:
+                # Fill free slots in planned order
+                while waiting and len(running) < limit:
+                    if slots is not None:
+                        if not slots.try_acquire():
+                            if running:
+                                break  # Look again at the next deadline or poll
+                            if not slots.acquire(self._stop_event):
+                                break  # Stopped while waiting
+                            slot_free_ns = self.timer.now_ns()
+                        held += 1
+                    job = waiting.pop(0)
+                    on_ns = self.timer.edge(job.pump, 1, slot_free_ns)
+                    job.started_at = on_ns / 1e9
+                    job.deadline_ns = on_ns + int(job.duration * 1e9)
+                    running.append(job)
+                if not running:
+                    break
+
+                # Wait for the next deadline. The timer waits on the stop
+                # event, so an emergency stop wakes us at once. A job that
+                # found every shared slot taken looks again every poll.
+                running.sort(key=lambda job: job.deadline_ns)
+                deadline_ns = running[0].deadline_ns
+                wake_ns = deadline_ns
+                if waiting and len(running) < limit:
+                    wake_ns = min(deadline_ns, self.timer.now_ns() + int(SLOT_POLL_SECONDS * 1e9))
+                if self.timer.wait_until(wake_ns, self._stop_event):
+                    break
+
+                while running and running[0].deadline_ns <= self.timer.now_ns():
+                    job = running.pop(0)
+                    off_ns = self.timer.edge(job.pump, 0, job.deadline_ns)
+                    job.stopped_at = off_ns / 1e9
+                    if slots is not None:
+                        slots.release()
+                        held -= 1
+                    if on_job_done:
+                        on_job_done(job)
+                slot_free_ns = deadline_ns if wake_ns == deadline_ns else self.timer.now_ns()
+        finally:
+            # Never leave a pump running if the pour was stopped or failed
+            for job in jobs:
+                if job.started_at is not None and not job.done:
+                    job.pump.off()
+                    job.stopped_at = clock.monotonic()
+            if slots is not None:
+                slots.release(held)
+            with self._lock:
+                self._active_jobs = []
+
+        return DispenseResult(jobs, started_at, clock.monotonic(),
+                              stopped=self._stop_event.is_set())
+
+    def progress(self):
+        """Return (overall, {name: fraction}) for the running pour.
+
+        The overall value weights each pump by its run time, which is
+        proportional to the volume it pours.
+        """
+        with self._lock:
+            jobs = list(self._active_jobs)
+        if not jobs:
+            return 0.0, {}
+        now = self.timer.clock.monotonic()
+        per_pump = {job.name: job.progress(now) for job in jobs}
+        total = sum(job.duration for job in jobs)
+        overall = sum(job.duration * job.progress(now) for job in jobs) / total
+        return overall, per_pump
+
+    def stop(self):
+        """Cut every pump of the running pour from the calling thread.
+
+        Returns the seconds it took until all pumps were off.
+        """
+        triggered_at = time.monotonic()
+        with self._lock:
+            self._epoch += 1
+            self._stop_event.set()
+            jobs = list(self._active_jobs)
+        for job in jobs:
+            try:
+                job.pump.off()
+            except Exception as e:
+                print(f"  ! Error stopping pump for {job.name}: {e}")
+        self.last_stop_latency = time.monotonic() - triggered_at
+        return self.last_stop_latency
@@ -0,0 +1,221 @@
+"""Emergency stop shared by every process that drives pumps.
+
+On the Pi each process owns the GPIO lines it claimed and no other
+process can write them. The processes that own pump pins, pump_daemon.py
+and pump_sweep.py when it sweeps on its own pins, each listen on a Unix
+datagram socket in ESTOP_DIR, and trigger() or broadcast() sends one
+datagram to each of them. Clients such as app.py and
+cocktail_interface.py own no pins: they trigger a stop through the
+daemon's 'stop' command, or call broadcast() when the daemon's command
+socket does not answer. The listener thread switches all of its
+process's power pins off in one batch (hardware.all_off), runs the
+process's stop hooks (stop the pour, sweep and test runs), switches the
+pins off again in case a hook raced a pump back on, and replies with the
+measured latency.
+
+Latency is measured from the trigger to the pins being low. Both ends
+read CLOCK_MONOTONIC, which is shared by all processes, so it includes
+the socket hop and the listener's wake-up.
+
+    python3 estop.py    stop every pump process and print their latencies
+"""
+import argparse
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import hardware
+import metrics
+from frame_stats import RollingStats
+
+ESTOP_DIR = os.environ.get('MIXALOT_ESTOP_DIR', os.path.join(tempfile.gettempdir(), 'mix-a-lot-estop'))
+REPLY_TIMEOUT = 0.25  # Seconds trigger() waits for the other processes to report
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)  # Seconds
+
+
+def _socket_dir(directory):
+    os.makedirs(directory, exist_ok=True)
+    try:
+        os.chmod(directory, 0o1777)  # The kiosk and the web app may run as different users
+    except OSError:
+        pass
+    return directory
+
+
+def broadcast(source, triggered_ns=None, directory=ESTOP_DIR, exclude=None, wait=REPLY_TIMEOUT):
+    """Send a stop to every listening process except exclude (a socket path).
+
+    Waits up to wait seconds for their replies and returns them as dicts
+    with name, pid, pins and latency_ms. Sockets of processes that are
+    gone are removed.
+    """
+    triggered_ns = triggered_ns or time.monotonic_ns()
+    directory = _socket_dir(directory)
+    sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    reply_path = None
+    try:
+        if wait:
+            reply_path = os.path.join(directory, f"reply-{os.getpid()}-{threading.get_ident()}")
+            if os.path.exists(reply_path):
+                os.unlink(reply_path)
+            sender.bind(reply_path)
+        message = json.dumps({'source': source, 'triggered_ns': triggered_ns,
+                              'reply_to': reply_path}).encode()
+        sent = 0
+        for entry in os.listdir(directory):
+            path = os.path.join(directory, entry)
+            if not entry.endswith('.sock') or path == exclude:
+                continue
+            try:
+                sender.sendto(message, path)
+                sent += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                try:
+                    os.unlink(path)  # Left behind by a process that died
+                except OSError:
+                    pass
+            except OSError as e:
+                print(f"  ! Cannot send emergency stop to {entry}: {e}")
+
+        replies = []
+        deadline = time.monotonic() + wait
+        while len(replies) < sent:
+            remaining = deadline - time.monotonic()
+            if not wait or remaining <= 0:
+                break
+            sender.settimeout(remaining)
+            try:
+                replies.append(json.loads(sender.recv(4096)))
+            except socket.timeout:
+                break
+        return replies
+    finally:
+        sender.close()
+        if reply_path:
+            try:
+                os.unlink(reply_path)
+            except OSError:
+                pass
+
+
+class EmergencyStop:
+    """One process's end of the shared emergency stop."""
+
+    def __init__(self, name, devices, directory=ESTOP_DIR):
+        # devices() -> the power pin devices this process owns right now
+        self.name = name
+        self._devices = devices
+        self._directory = directory
+        self._hooks = []
+        self._socket = None
+        self._thread = None
+        self.path = None
+        self.stats = RollingStats(window=100)  # Trigger to pins low, in milliseconds
+        self.latency = metrics.Histogram('mixalot_estop_latency_seconds',
+                                         'Emergency stop trigger to power pins low', ['source'],
+                                         LATENCY_BUCKETS)
+        self.last = None  # Report of the last stop
+
+    def on_stop(self, hook):
+        """Call hook(source) on every stop, after the pins are off."""
+        self._hooks.append(hook)
+
+    def listen(self):
+        """Start receiving stops triggered by other processes."""
+        directory = _socket_dir(self._directory)
+        self.path = os.path.join(directory, f"{self.name}-{os.getpid()}.sock")
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self.path)
+        os.chmod(self.path, 0o666)
+        self._thread = threading.Thread(target=self._listen, name='estop-listener', daemon=True)
+        self._thread.start()
+
+    def trigger(self, source, wait=0):
+        """Stop this process's pumps, then every other process's.
+
+        Returns the reports of this process and of every process that
+        replied within wait seconds.
+        """
+        triggered_ns = time.monotonic_ns()
+        report = self.stop(source, triggered_ns)
+        return [report] + broadcast(source, triggered_ns, self._directory, exclude=self.path, wait=wait)
+
+    def stop(self, source, triggered_ns=None):
+        """Switch this process's pumps off and run the stop hooks; returns a report."""
+        triggered_ns = triggered_ns or time.monotonic_ns()
+        pins = hardware.all_off(self._devices())
+        latency_ms = (time.monotonic_ns() - triggered_ns) / 1e6
+        for hook in self._hooks:
+            try:
+                hook(source)
+            except Exception as e:
+                print(f"  ! Error in emergency stop hook: {e}")
+        hardware.all_off(self._devices())
+        self.stats.record(latency_ms)
+        self.latency.observe(latency_ms / 1000, source=source)
+        self.last = {'name': self.name, 'pid': os.getpid(), 'source': source,
+                     'pins': pins, 'latency_ms': latency_ms, 'time': time.time()}
+        print(f"EMERGENCY STOP ({source}): {pins} pump(s) off in {latency_ms:.2f} ms")
+        return self.last
+
+    def summary(self):
+        return {'latency': self.stats.summary(), 'last': self.last}
+
+    def close(self):
+        if self._socket is None:
+            return
+        path, self.path = self.path, None
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)  # Wakes the listener's recv
+        except OSError:
+            pass
+        self._socket.close()
+        self._socket = None
+
+    def _listen(self):
+        sock = self._socket
+        while True:
+            try:
+                data = sock.recv(4096)
+            except OSError:
+                return
+            if not data:
+                return  # Shut down by close()
+            try:
+                message = json.loads(data)
+            except ValueError:
+                continue
+            report = self.stop(message.get('source', 'unknown'), message.get('triggered_ns'))
+            if message.get('reply_to'):
+                try:
+                    sock.sendto(json.dumps(report).encode(), message['reply_to'])
+                except OSError:
+                    pass  # The sender stopped waiting
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stop every pump in every Mix-a-Lot process.')
+    parser.add_argument('--source', default='command line', help='shown in the logs of every process')
+    parser.add_argument('--dir', default=ESTOP_DIR, help='socket directory of the pump processes')
+    args = parser.parse_args()
+
+    replies = broadcast(args.source, directory=args.dir)
+    if not replies:
+        print(f"No pump process answered (sockets in {args.dir})")
+        raise SystemExit(1)
+    for reply in sorted(replies, key=lambda r: r['latency_ms']):
+        print(f"  {reply['name']} (pid {reply['pid']}): {reply['pins']} pump(s) off "
+              f"in {reply['latency_ms']:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
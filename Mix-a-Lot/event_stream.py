@@ -0,0 +1,80 @@
+"""Live pump events for the web UI as Server-Sent Events.
+
+Every event is serialised once, on publish, into a shared ring buffer.
+Each connected browser tab only keeps the sequence number of the last
+event it was sent and waits on one shared Condition, so a new tab costs
+a sleeping thread and no extra work per event. A tab that falls more
+than the ring size behind skips ahead and is told to resync.
+"""
+import collections
+import json
+import threading
+import time
+
+HEARTBEAT_SECONDS = 15  # Comment line sent when idle so proxies keep the stream open
+
+
+def format_event(seq, event_type, data):
+    """One event in text/event-stream format."""
+    return f"id: {seq}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+class Broadcaster:
+    """Fan-out of published events to any number of streaming clients."""
+
+    def __init__(self, keep=256):
+        self._condition = threading.Condition()
+        self._events = collections.deque(maxlen=keep)  # (seq, formatted event)
+        # Ids continue from the clock, so a Last-Event-ID from before a server
+        # restart never matches this run's ring and gets a fresh snapshot
+        self._seq = time.time_ns() // 1_000_000
+        self._closed = False
+        self.clients = 0
+
+    def publish(self, event_type, data):
+        """Send an event to every client; cheap enough to call from pump threads."""
+        data = dict(data, time=time.time())
+        with self._condition:
+            self._seq += 1
+            self._events.append((self._seq, format_event(self._seq, event_type, data)))
+            self._condition.notify_all()
+
+    def close(self):
+        """End every stream, e.g. when the server shuts down."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def stream(self, snapshot=None, last_event_id=None):
+        """Generator of text/event-stream chunks for one client.
+
+        snapshot() returns the current state, sent first as a 'snapshot'
+        event. last_event_id (the browser's Last-Event-ID after a
+        reconnect) resumes from the ring instead, when it still can.
+        """
+        with self._condition:
+            self.clients += 1
+            oldest = self._events[0][0] if self._events else self._seq + 1
+            resume = last_event_id is not None and oldest <= last_event_id + 1 <= self._seq + 1
+            last_seq = last_event_id if resume else self._seq
+        try:
+            if not resume and snapshot is not None:
+                yield format_event(last_seq, 'snapshot', snapshot())
+            while True:
+                with self._condition:
+                    if self._seq == last_seq and not self._closed:
+                        self._condition.wait(HEARTBEAT_SECONDS)
+                    if self._closed:
+                        return
+                    pending = [(seq, text) for seq, text in self._events if seq > last_seq]
+                    skipped = bool(pending) and pending[0][0] > last_seq + 1
+                    last_seq = self._seq
+                if skipped and snapshot is not None:
+                    yield format_event(last_seq, 'snapshot', snapshot())  # Fell behind the ring
+                elif pending:
+                    yield ''.join(text for _, text in pending)
+                else:
+                    yield ': heartbeat\n\n'
+        finally:
+            with self._condition:
+                self.clients -= 1
@@ -0,0 +1,155 @@
+"""Frame-time and input-latency instrumentation for the kiosk.
+
+A sluggish touchscreen can come from slow painting, a slow display
+flip, or the main loop being blocked while it should handle input.
+FrameProfiler keeps a rolling window of each as a named series, draws
+their percentiles as an optional overlay and writes them to a JSON file
+at a fixed interval so the renderer can be tuned on the real Pi.
+
+Series recorded by cocktail_interface.py (all in milliseconds):
+
+    frame          draw() calls that painted something, flip included
+    flip           pygame.display.flip/update alone
+    input_latency  input event received to the frame that shows it
+    mix_cocktail   main loop blocked starting a pour
+"""
+import collections
+import contextlib
+import json
+import os
+import tempfile
+import time
+
+
+class RollingStats:
+    """The last `window` samples of one series, in milliseconds."""
+
+    def __init__(self, window=600):
+        self._samples = collections.deque(maxlen=window)
+        self.count = 0  # All samples ever recorded, not just the window
+
+    def record(self, ms):
+        self._samples.append(ms)
+        self.count += 1
+
+    def summary(self):
+        """Return count, mean, percentiles and max of the window."""
+        samples = sorted(self._samples)
+        if not samples:
+            return {'count': self.count}
+
+        def percentile(p):
+            return samples[min(int(len(samples) * p), len(samples) - 1)]
+
+        return {
+            'count': self.count,
+            'mean_ms': sum(samples) / len(samples),
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+            'max_ms': samples[-1],
+        }
+
+
+class FrameProfiler:
+    """Named RollingStats series plus overlay drawing and periodic JSON export."""
+
+    def __init__(self, export_file=None, export_interval=30.0, window=600):
+        self.export_file = export_file
+        self.export_interval = export_interval
+        self.window = window
+        self.series = {}
+        self.overlay = False
+        self.pending_input = None  # perf_counter() of the oldest input not yet on screen
+        self.started = time.time()
+        self._last_export = time.perf_counter()
+
+    def record(self, name, seconds):
+        stats = self.series.get(name)
+        if stats is None:
+            stats = self.series[name] = RollingStats(self.window)
+        stats.record(seconds * 1000)
+
+    @contextlib.contextmanager
+    def measure(self, name):
+        """Record the time spent inside the with block under name."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def input_received(self, when=None):
+        """Note that an input event arrived; the next rendered() closes its latency."""
+        if self.pending_input is None:
+            self.pending_input = when if when is not None else time.perf_counter()
+
+    def rendered(self):
+        """Call after a frame reached the display."""
+        if self.pending_input is not None:
+            self.record('input_latency', time.perf_counter() - self.pending_input)
+            self.pending_input = None
+
+    def summary(self):
+        return {name: stats.summary() for name, stats in sorted(self.series.items())}
+
+    def toggle_overlay(self):
+        self.overlay = not self.overlay
+        return self.overlay
+
+    def draw_overlay(self, surface, font, rect):
+        """Draw p50/p95/max of every series into rect on surface."""
+        surface.fill((0, 0, 0), rect)
+        line_height = font.get_linesize()
+        y = rect.y + 4
+        rows = [('ms', 'p50', 'p95', 'max')]
+        for name, summary in self.summary().items():
+            if 'p50_ms' in summary:
+                rows.append((name, f"{summary['p50_ms']:.1f}", f"{summary['p95_ms']:.1f}",
+                             f"{summary['max_ms']:.1f}"))
+        # Name column on the left, numbers right-aligned in the last 45% of the width
+        column_width = rect.width * 0.15
+        for row in rows:
+            if y + line_height > rect.bottom:
+                break
+            surface.blit(font.render(row[0], True, (0, 255, 0)), (rect.x + 4, y))
+            for i, value in enumerate(row[1:], 1):
+                text = font.render(value, True, (0, 255, 0))
+                right = rect.right - 4 - (3 - i) * column_width
+                surface.blit(text, (right - text.get_width(), y))
+            y += line_height
+
+    def maybe_export(self):
+        """Write the JSON file if export_interval has passed since the last write."""
+        if not self.export_file:
+            return False
+        now = time.perf_counter()
+        if now - self._last_export < self.export_interval:
+            return False
+        self._last_export = now
+        self.export()
+        return True
+
+    def export(self):
+        if not self.export_file:
+            return
+        data = {
+            'started': self.started,
+            'exported': time.time(),
+            'window': self.window,
+            'series': self.summary(),
+        }
+        directory = os.path.dirname(os.path.abspath(self.export_file))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # Written atomically so a reader never sees a half-written file
+            fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(data, f, indent=2)
+                os.replace(temp_path, self.export_file)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except OSError as e:
+            print(f"Could not write frame stats to {self.export_file}: {e}")
@@ -0,0 +1,174 @@
+"""Hardware backend selection and the clock pump timing runs on.
+
+The backend is chosen with environment variables so the same scripts run
+on the Pi and on any Linux box:
+
+    MIXALOT_BACKEND=lgpio    real GPIO through lgpio (default)
+    MIXALOT_BACKEND=sim      gpiozero mock pins; every edge is recorded
+    MIXALOT_CLOCK=virtual    with the sim backend, sleeps return at once and
+                             only advance a virtual clock, so pours and test
+                             sweeps run thousands of times faster than real time
+    MIXALOT_EDGE_LOG=path    with the sim backend, write the recorded pin-edge
+                             timeline to this JSON file on exit
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+from gpiozero import Device
+from gpiozero.pins.mock import MockFactory, MockPin
+
+BACKEND = os.environ.get('MIXALOT_BACKEND', 'lgpio')
+CLOCK = os.environ.get('MIXALOT_CLOCK', 'real')
+EDGE_LOG_FILE = os.environ.get('MIXALOT_EDGE_LOG')
+PI5_REVISION = 'd04170'  # Board revision the simulated pins pretend to be
+
+
+class RealClock:
+    """Wall-clock time; sleeping really sleeps."""
+
+    virtual = False
+
+    def monotonic_ns(self):
+        return time.monotonic_ns()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def wait(self, event, timeout):
+        """Wait for event up to timeout seconds; returns True if it was set."""
+        return event.wait(timeout)
+
+
+class VirtualClock:
+    """Simulated time that jumps forward instead of sleeping.
+
+    There is one clock for all threads and every sleep advances it, so
+    timing is only right while one thread at a time waits on it (sweeps
+    run their pumps one after another on it).
+    """
+
+    virtual = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._now_ns = 0
+
+    def monotonic_ns(self):
+        with self._lock:
+            return self._now_ns
+
+    def monotonic(self):
+        return self.monotonic_ns() / 1e9
+
+    def advance(self, seconds):
+        if seconds <= 0:
+            return
+        with self._lock:
+            self._now_ns += max(1, round(seconds * 1e9))
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def wait(self, event, timeout):
+        """Return at once: True if event is set, else advance by timeout."""
+        if event.is_set():
+            return True
+        self.advance(timeout)
+        return event.is_set()
+
+
+class EdgeLog:
+    """Timeline of simulated pin edges as (time_ns, pin, state)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.edges = []
+
+    def record(self, pin, state):
+        with self._lock:
+            self.edges.append((clock.monotonic_ns(), pin, int(state)))
+
+    def clear(self):
+        with self._lock:
+            self.edges.clear()
+
+    def on_times(self):
+        """Total seconds each pin spent high, from the recorded edges."""
+        totals = {}
+        high_since = {}
+        with self._lock:
+            edges = list(self.edges)
+        for t_ns, pin, state in edges:
+            if state and pin not in high_since:
+                high_since[pin] = t_ns
+            elif not state and pin in high_since:
+                totals[pin] = totals.get(pin, 0.0) + (t_ns - high_since.pop(pin)) / 1e9
+        return totals
+
+    def save(self, filename):
+        with self._lock:
+            edges = [{'t_ns': t_ns, 'pin': pin, 'state': state} for t_ns, pin, state in self.edges]
+        with open(filename, 'w') as f:
+            json.dump({'clock': CLOCK, 'edges': edges}, f, indent=2)
+        print(f"Wrote {len(edges)} pin edges to {filename}")
+
+
+class SimPin(MockPin):
+    """Mock pin that adds every state change to the edge log."""
+
+    def _change_state(self, value):
+        changed = super()._change_state(value)
+        if changed:
+            edge_log.record(self.info.name, value)
+        return changed
+
+
+clock = VirtualClock() if BACKEND == 'sim' and CLOCK == 'virtual' else RealClock()
+edge_log = EdgeLog()
+
+
+def setup_pin_factory(backend=None):
+    """Set gpiozero's default pin factory for the selected backend."""
+    backend = backend or BACKEND
+    if backend == 'sim':
+        print(f"Using simulated GPIO ({'virtual' if clock.virtual else 'real'} clock)")
+        Device.pin_factory = MockFactory(revision=PI5_REVISION, pin_class=SimPin)
+        if EDGE_LOG_FILE:
+            atexit.register(edge_log.save, EDGE_LOG_FILE)
+    elif backend == 'lgpio':
+        # Imported here so the simulated backend works without lgpio installed
+        from gpiozero.pins.lgpio import LGPIOFactory
+        Device.pin_factory = LGPIOFactory()
+    else:
+        raise ValueError(f"Unknown MIXALOT_BACKEND '{backend}' (use 'lgpio' or 'sim')")
+    return Device.pin_factory
+
+
+def all_off(devices):
+    """Switch every output device off in one batch; returns how many were written.
+
+    On lgpio the lines are written straight through lgpio.gpio_write in one
+    tight loop, without gpiozero's per-call locking and checks: lines that
+    gpiozero claimed one by one cannot be joined into an lgpio group write.
+    Other backends switch each device off() as usual.
+    """
+    lgpio = sys.modules.get('lgpio')
+    written = 0
+    for device in devices:
+        try:
+            handle = getattr(device.pin.factory, '_handle', None)
+            if lgpio is not None and handle is not None:
+                lgpio.gpio_write(handle, device.pin.number, 0 if device.active_high else 1)
+            else:
+                device.off()
+            written += 1
+        except Exception as e:
+            print(f"  ! Error switching off {device}: {e}")
+    return written
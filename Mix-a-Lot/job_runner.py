@@ -0,0 +1,154 @@
+"""Background jobs for long pump operations in the web app.
+
+A pump test runs for seconds. Done inside the request it holds a Flask
+worker the whole time, so a few parallel tests make the page hang.
+JobRunner runs them on a small thread pool instead: the request returns
+a job id at once and the page polls the job's state.
+
+A job moves queued -> running -> done or failed. cancel_all() (used by
+the emergency stop) fails queued jobs before they start; running jobs
+wait on the pump daemon, whose stop command ends them, and they then
+fail with JobCancelled. on_change(job) is called after every state
+change, e.g. to push it to the web UI.
+"""
+import collections
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobCancelled(Exception):
+    """Raised by job functions whose pump operation was stopped early."""
+
+
+class Job:
+    """One submitted operation and its current state."""
+
+    def __init__(self, job_id, kind, params):
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.state = QUEUED
+        self.message = ''
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None  # Structured output a job function may fill in as it goes
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'params': self.params,
+            'state': self.state,
+            'message': self.message,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'result': self.result,
+        }
+
+
+class JobRunner:
+    """Runs jobs on a thread pool and remembers the last `keep` of them."""
+
+    def __init__(self, max_workers=3, keep=200, on_change=None):
+        self.on_change = on_change
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='pump-job')
+        self._lock = threading.Lock()
+        self._jobs = collections.OrderedDict()  # job id -> Job, oldest first
+        self.keep = keep
+
+    def submit(self, kind, function, params=None, on_finish=None):
+        """Queue function(job) and return the Job at once.
+
+        function returns a message for a done job; an exception fails the
+        job with its text. on_finish(job) is called after either outcome.
+        """
+        with self._lock:
+            job = Job(uuid.uuid4().hex[:12], kind, params or {})
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.keep:
+                oldest_id, oldest = next(iter(self._jobs.items()))
+                if oldest.state in (QUEUED, RUNNING):
+                    break  # Never forget a job that is still in flight
+                del self._jobs[oldest_id]
+        self._changed(job)
+        self._executor.submit(self._run, job, function, on_finish)
+        return job
+
+    def report(self, job):
+        """Announce progress a running job made, e.g. a partly filled result."""
+        self._changed(job)
+
+    def _changed(self, job):
+        if self.on_change:
+            try:
+                self.on_change(job)
+            except Exception as e:
+                print(f"Error reporting job {job.id}: {e}")
+
+    def _run(self, job, function, on_finish):
+        try:
+            with self._lock:
+                if job.state != QUEUED:
+                    return  # Cancelled while waiting
+                job.state = RUNNING
+                job.started = time.time()
+            self._changed(job)
+            try:
+                message = function(job)
+                state = DONE
+            except JobCancelled as e:
+                message, state = str(e) or 'Stopped', FAILED
+            except Exception as e:
+                message, state = f"Error: {e}", FAILED
+            with self._lock:
+                job.state = state
+                job.message = message or ''
+                job.finished = time.time()
+            self._changed(job)
+        finally:
+            if on_finish:
+                on_finish(job)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        """All remembered jobs as dicts, newest first."""
+        with self._lock:
+            return [job.to_dict() for job in reversed(self._jobs.values())]
+
+    def active(self):
+        with self._lock:
+            return [job for job in self._jobs.values() if job.state in (QUEUED, RUNNING)]
+
+    def cancel_all(self, message='Stopped by emergency stop'):
+        """Fail queued jobs before they start. Returns how many were cancelled.
+
+        Running jobs are not touched: they end when the pump daemon stops
+        their pumps.
+        """
+        cancelled = []
+        with self._lock:
+            for job in self._jobs.values():
+                if job.state == QUEUED:
+                    job.state = FAILED
+                    job.message = message
+                    job.finished = time.time()
+                    cancelled.append(job)
+        for job in cancelled:
+            self._changed(job)
+        return len(cancelled)
+
+    def shutdown(self):
+        self.cancel_all('Server shutting down')
+        self._executor.shutdown(wait=True)
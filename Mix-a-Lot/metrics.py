@@ -0,0 +1,147 @@
+"""Counters, gauges and histograms in the Prometheus text format.
+
+The pump daemon and the web app each keep a Registry; app.py's /metrics
+serves both, so one scrape covers the web requests and the pumps. This
+avoids the prometheus_client dependency for the handful of metrics we
+need. An update takes one lock and a dict lookup (about 2 µs), cheap
+enough for the pump threads: it runs after the pin has switched.
+
+    requests = Counter('mixalot_requests_total', 'Requests served', ['route'])
+    requests.inc(route='/sweep')
+    registry.register(requests)
+    registry.render()  # Text for GET /metrics
+"""
+import bisect
+import math
+import threading
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)  # Seconds
+
+
+def _escape(text, quote=True):
+    text = str(text).replace('\\', '\\\\').replace('\n', '\\n')
+    return text.replace('"', '\\"') if quote else text
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class Metric:
+    """One metric family; a value per combination of label values."""
+
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}  # Tuple of label values -> value
+
+    def _key(self, labels):
+        try:
+            return tuple(str(labels[name]) for name in self.labels)
+        except KeyError as e:
+            raise ValueError(f"Metric {self.name} needs label {e}")
+
+    def render(self):
+        lines = [f"# HELP {self.name} {_escape(self.help, quote=False)}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            # Histograms keep a list per key; copy it so observations can go on meanwhile
+            values = sorted((key, list(value) if isinstance(value, list) else value)
+                            for key, value in self._values.items())
+        for key, value in values:
+            lines.extend(self._samples(list(zip(self.labels, key)), value))
+        return lines
+
+    def _samples(self, pairs, value):
+        return [f"{self.name}{_labels(pairs)} {_number(value)}"]
+
+
+class Counter(Metric):
+    """A value that only goes up, e.g. edges switched or drinks poured."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down, e.g. jobs waiting."""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """Observations counted into buckets by upper bound, plus their count and sum."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)  # len(buckets) is the +Inf bucket
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def _samples(self, pairs, counts):
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            total += count
+            lines.append(f"{self.name}_bucket{_labels(pairs + [('le', _number(float(bound)))])} {total}")
+        lines.append(f"{self.name}_sum{_labels(pairs)} {_number(counts[-1])}")
+        lines.append(f"{self.name}_count{_labels(pairs)} {total}")
+        return lines
+
+
+class Registry:
+    """The metrics of one process, rendered together."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
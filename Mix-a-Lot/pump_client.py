@@ -0,0 +1,263 @@
+"""Client side of the pump daemon (see pump_daemon.py for the protocol).
+
+PumpClient keeps one persistent connection to the daemon and may have any
+number of requests in flight on it; answers are matched to requests by
+id. If the daemon restarts, the client reconnects in the background and
+subscribes to events again. RemoteDispenser is the kiosk's handle on
+pours running in the daemon: it submits them without blocking the UI and
+reports their progress through poll().
+"""
+import itertools
+import json
+import os
+import queue
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+from dispenser import DispenseResult
+
+SOCKET_PATH = os.environ.get('MIXALOT_PUMPD_SOCKET',
+                             os.path.join(tempfile.gettempdir(), 'mix-a-lot-pumpd.sock'))
+CALL_TIMEOUT = 5.0  # Seconds call() waits for an answer unless told otherwise
+RECONNECT_SECONDS = 1.0  # Pause between attempts to reach a daemon that is down
+
+
+class PumpDaemonError(Exception):
+    """The daemon is unreachable or answered a command with an error."""
+
+
+class PumpClient:
+    """Persistent, pipelined connection to the pump daemon."""
+
+    def __init__(self, path=SOCKET_PATH, on_event=None):
+        self.path = path
+        self.on_event = on_event  # on_event(name, data) for pump and e-stop events; subscribes if set
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._pending = {}  # request id -> (Future, on_progress)
+        self._sock = None
+        self._closed = False
+        self._connect()
+        self._thread = threading.Thread(target=self._run, name='pumpd-client', daemon=True)
+        self._thread.start()
+
+    @property
+    def connected(self):
+        return self._sock is not None
+
+    def submit(self, command, on_progress=None, **arguments):
+        """Send a command without waiting; returns a Future of its result.
+
+        on_progress(event, data) is called for progress the daemon reports
+        before the answer, e.g. each pump of a sweep.
+        """
+        future = Future()
+        with self._lock:
+            if self._sock is None:
+                raise PumpDaemonError(f"Pump daemon not running ({self.path})")
+            request_id = next(self._ids)
+            self._pending[request_id] = (future, on_progress)
+            message = dict(arguments, id=request_id, cmd=command)
+            try:
+                self._sock.sendall((json.dumps(message) + '\n').encode())
+            except OSError as e:
+                del self._pending[request_id]
+                raise PumpDaemonError(f"Lost connection to pump daemon: {e}")
+        return future
+
+    def call(self, command, timeout=CALL_TIMEOUT, on_progress=None, **arguments):
+        """Send a command and wait for its result; None waits as long as it runs."""
+        future = self.submit(command, on_progress, **arguments)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            raise PumpDaemonError(f"Pump daemon did not answer '{command}' within {timeout}s")
+
+    def close(self):
+        """Disconnect; the daemon stops whatever this client still had running."""
+        self._closed = True
+        with self._lock:
+            sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)  # Wakes the reader thread
+            except OSError:
+                pass
+            sock.close()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            return None
+        with self._lock:
+            self._sock = sock
+        if self.on_event:
+            try:
+                self.submit('subscribe')
+            except PumpDaemonError:
+                pass
+        return sock
+
+    def _run(self):
+        while not self._closed:
+            sock = self._sock or self._connect()
+            if sock is None:
+                time.sleep(RECONNECT_SECONDS)
+                continue
+            try:
+                with sock.makefile('rb') as lines:
+                    for line in lines:
+                        self._dispatch(json.loads(line))
+            except (OSError, ValueError):
+                pass
+            self._disconnected(sock)
+
+    def _dispatch(self, message):
+        request_id = message.get('id')
+        if request_id is None:
+            if self.on_event:
+                try:
+                    self.on_event(message.get('event'), message.get('data'))
+                except Exception as e:
+                    print(f"Error handling pump daemon event: {e}")
+            return
+        progress = 'event' in message
+        with self._lock:
+            if progress:
+                entry = self._pending.get(request_id)
+            else:
+                entry = self._pending.pop(request_id, None)
+        if entry is None:
+            return
+        future, on_progress = entry
+        if progress:
+            if on_progress:
+                try:
+                    on_progress(message['event'], message.get('data'))
+                except Exception as e:
+                    print(f"Error handling pump daemon progress: {e}")
+        elif message.get('ok'):
+            future.set_result(message.get('result'))
+        else:
+            future.set_exception(PumpDaemonError(message.get('error') or 'Unknown error'))
+
+    def _disconnected(self, sock):
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+            pending, self._pending = self._pending, {}
+        sock.close()
+        for future, _ in pending.values():
+            future.set_exception(PumpDaemonError("Connection to pump daemon lost"))
+
+
+class RemoteDispenser:
+    """Pours drinks in the pump daemon for the kiosk, never blocking its UI thread.
+
+    The kiosk drains events once per frame with poll(). Events are tuples
+    whose first element is the event name:
+
+        ('started', name)
+        ('pump_done', name, {name, seconds})
+        ('skipped', name, {name, pump_id, reason})  ingredient without a pump
+        ('finished', name, result)                  a DispenseResult
+        ('error', name, message)
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._events = queue.Queue()
+        self._pouring = threading.Event()
+        self._progress = (0.0, {})
+        self._progress_request = None
+
+    @property
+    def busy(self):
+        return self._pouring.is_set()
+
+    def submit(self, name, jobs):
+        """Start pouring jobs, a list of {name, pump_id, duration, direction}; returns at once."""
+        self._pouring.set()
+        self._progress = (0.0, {})
+        self._events.put(('started', name))
+        try:
+            future = self.client.submit('dispense', lambda event, data: self._events.put((event, name, data)),
+                                        name=name, jobs=jobs)
+        except PumpDaemonError as e:
+            self._pouring.clear()
+            self._events.put(('error', name, str(e)))
+            return
+        future.add_done_callback(lambda future: self._finished(name, future))
+
+    def _finished(self, name, future):
+        try:
+            self._events.put(('finished', name, DispenseResult.from_dict(future.result())))
+        except Exception as e:
+            self._events.put(('error', name, str(e)))
+        finally:
+            self._pouring.clear()
+
+    def progress(self):
+        """Latest (overall, {name: fraction}) of the pour.
+
+        Never waits: returns what the daemon last reported and asks for a
+        fresh value, which is ready by the next frame.
+        """
+        request = self._progress_request
+        if request is None or request.done():
+            if request is not None and request.exception() is None:
+                result = request.result()
+                self._progress = (result['overall'], result['pumps'])
+            self._progress_request = None
+            if self._pouring.is_set():
+                try:
+                    self._progress_request = self.client.submit('progress')
+                except PumpDaemonError:
+                    pass
+        return self._progress
+
+    def stop(self, source='kiosk'):
+        """Emergency stop of every pump, through the daemon; returns each process's report."""
+        return self.client.call('stop', source=source)['processes']
+
+    def poll(self):
+        """Return all events reported since the last call, without blocking."""
+        events = []
+        try:
+            while True:
+                events.append(self._events.get_nowait())
+        except queue.Empty:
+            pass
+        return events
+
+    def shutdown(self):
+        """Disconnect; the daemon stops a pour this kiosk left running."""
+        self.client.close()
+
+
+def daemon_running(path=SOCKET_PATH):
+    """True if a pump daemon accepts connections on path."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def exit_if_daemon_running(path=SOCKET_PATH):
+    """For scripts that claim the pump pins themselves: refuse while the daemon owns them."""
+    if not daemon_running(path):
+        return
+    print(f"The pump daemon owns the GPIO pins ({path}). Stop it first "
+          f"(sudo systemctl stop mix-a-lot-pumpd) or use the web interface.")
+    sys.exit(1)
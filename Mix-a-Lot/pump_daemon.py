@@ -0,0 +1,550 @@
+"""Pump daemon: the one process that owns the pump GPIO pins.
+
+The web app, the kiosk and the test scripts used to claim the pins
+themselves, with different pin maps, and fought over them when run
+together. The daemon claims every pump in pumpen.json once; app.py and
+cocktail_interface.py are clients (pump_client.py) on a Unix socket:
+
+    python3 pump_daemon.py [--config pumpen.json] [--socket PATH]
+    python3 pump_daemon.py --ping      exit status 0 if a daemon answers
+
+Protocol: one JSON object per line in each direction. A request is
+{"id": n, "cmd": name, ...arguments}; its answer is {"id": n, "ok": true,
+"result": ...} or {"id": n, "ok": false, "error": text}. Long commands
+may first send {"id": n, "event": name, "data": ...} progress lines.
+Clients can send more requests without waiting for answers (pipelining);
+answers carry the request id and may come back out of order. After
+"subscribe" a connection also receives {"event": name, "data": ...}
+lines for pump edges and emergency stops.
+
+    ping                                  daemon pid
+    status                                pins and state of every pump
+    sync                                  re-read pumpen.json, rebuild changed pumps
+    run {pump_id, direction, duration}    one test run; {"stopped": bool}
+    sweep {max_parallel, duration}        see pump_sweep.py; 'sweep_result' per pump
+    dispense {name, jobs}                 pour [{name, pump_id, duration, direction}];
+                                          'pump_done' per pump
+    progress                              progress of the running pour
+    stop {source}                         emergency stop, here and in every process (estop.py)
+    subscribe                             receive 'pump' and 'estop' events; returns status
+    timing                                edge timing and e-stop latency statistics
+    metrics                               {"text": pump, pour and e-stop metrics} (metrics.py)
+
+Every pump has a lock, so a pump running for one client is busy for all
+others. Every pump switched on also holds one of max_parallel_pumps
+shared slots (pump_pool.PumpSlots), so pours, sweeps and test runs
+together stay within the power supply; a command that finds them all
+taken waits. When a client disconnects, whatever it started is stopped:
+a crashed kiosk cannot leave a pump running.
+"""
+import argparse
+import contextlib
+import json
+import os
+import queue
+import signal
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from gpiozero import DigitalOutputDevice, GPIOZeroError
+
+import estop
+import hardware
+import metrics
+import pump_sweep
+from config_store import ConfigStore
+from dispenser import DispenseEngine, PumpJob, PumpScheduler
+from pump_client import SOCKET_PATH, daemon_running
+from pump_pool import PumpPool, PumpSlots
+from pump_timing import EdgeTimer, set_realtime_priority
+
+CONFIG_FILE = 'pumpen.json'  # The one pin map every client uses
+SCHEDULING_POLICY = 'longest_first'  # See dispenser.SCHEDULING_POLICIES
+DISPENSE_RT_PRIORITY = 10  # SCHED_FIFO priority for the pour thread (None to disable)
+COMMAND_WORKERS = 16  # Test runs and sweeps in flight across all clients
+MAX_RUN_SECONDS = 30.0  # Longest single test run the daemon accepts
+LONG_COMMANDS = ('run', 'sweep', 'dispense')  # Run off the connection's reader thread
+POUR_BUCKETS = (5, 10, 15, 20, 30, 45, 60, 90, 120, 180)  # Seconds
+
+
+class CommandError(Exception):
+    """A command that cannot be carried out; its text goes back to the client."""
+
+
+def setup_pump_gpio(pump_config):
+    """Initialize GPIO devices for a pump. Returns (power_pin, direction_pin) on success, else (None, None)."""
+    try:
+        print(f"- Initializing Pump {pump_config.get('id')} (Power: GPIO{pump_config.get('gpio_pin')}, Direction: GPIO{pump_config.get('direction_pin')})")
+        power_pin = DigitalOutputDevice(pump_config['gpio_pin'], initial_value=False)
+        direction_pin = DigitalOutputDevice(pump_config['direction_pin'], initial_value=False)
+        return power_pin, direction_pin
+    except GPIOZeroError as e:
+        print(f"  ! GPIO error initializing for Pump {pump_config.get('id')} "
+              f"(Pins: {pump_config.get('gpio_pin')}, {pump_config.get('direction_pin')}): {e}")
+        return None, None
+    except KeyError as e:
+        print(f"  ! Error: Missing key '{e}' in configuration for Pump {pump_config.get('id')}.")
+        return None, None
+    except Exception as e:
+        print(f"  ! Unexpected error initializing Pump {pump_config.get('id')}: {e}")
+        return None, None
+
+
+def direction_name(level):
+    return 'forward' if level == pump_sweep.FORWARD_LEVEL else 'backward'
+
+
+def direction_level(direction):
+    if direction not in ('forward', 'backward'):
+        raise CommandError(f"Unknown direction '{direction}'")
+    return pump_sweep.FORWARD_LEVEL if direction == 'forward' else pump_sweep.BACKWARD_LEVEL
+
+
+class Connection:
+    """One client: reads its pipelined requests, writes answers and events.
+
+    Messages are queued and written by a separate thread, so a slow client
+    never holds up a pump thread that reports an edge.
+    """
+
+    def __init__(self, daemon, sock):
+        self.daemon = daemon
+        self.sock = sock
+        self.subscribed = False
+        self.stop_events = set()  # One per command still running for this client
+        self._outbox = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write, name='pumpd-writer', daemon=True)
+
+    def send(self, message):
+        self._outbox.put(message)
+
+    def serve(self):
+        self._writer.start()
+        try:
+            with self.sock.makefile('rb') as lines:
+                for line in lines:
+                    try:
+                        request = json.loads(line)
+                    except ValueError:
+                        self.send({'ok': False, 'error': 'Invalid JSON'})
+                        continue
+                    if not isinstance(request, dict):
+                        self.send({'ok': False, 'error': 'Request must be a JSON object'})
+                        continue
+                    self.daemon.handle(self, request)
+        except OSError:
+            pass
+        finally:
+            self.daemon.disconnected(self)
+            self._outbox.put(None)
+            self._writer.join(timeout=1.0)
+            self.sock.close()
+
+    def _write(self):
+        while True:
+            message = self._outbox.get()
+            if message is None:
+                return
+            try:
+                self.sock.sendall((json.dumps(message) + '\n').encode())
+            except OSError:
+                return
+
+
+class PumpDaemon:
+    """Owns the pump devices and carries out the clients' commands."""
+
+    def __init__(self, config_file=CONFIG_FILE, socket_path=SOCKET_PATH):
+        self.socket_path = socket_path
+        self.config_store = ConfigStore(config_file)
+        self.max_parallel = self.config_store.max_parallel_pumps()  # The power supply's limit
+        self.slots = PumpSlots(self.max_parallel)  # Taken by every pump on edge, whichever command
+        self.pool = PumpPool(setup_pump_gpio)
+        # Times every pump edge against monotonic deadlines and keeps jitter statistics
+        self.timer = EdgeTimer(on_edge=self.publish_pin)
+        self.engine = DispenseEngine(PumpScheduler(self.max_parallel, SCHEDULING_POLICY), self.timer)
+        self.estop = estop.EmergencyStop('pumpd', lambda: [power_pin for _, (power_pin, _) in self.pool.items()])
+        self.estop.on_stop(self.on_emergency_stop)
+        self._executor = ThreadPoolExecutor(COMMAND_WORKERS, thread_name_prefix='pumpd-command')
+        self._lock = threading.Lock()
+        self._connections = set()
+        self._stop_events = set()  # Of every running test run and sweep
+        self._pour_lock = threading.Lock()
+        self._pour_owner = None  # Connection whose pour is running
+        self._rt_priority = DISPENSE_RT_PRIORITY  # None once the first attempt failed
+        self._server = None
+
+        self.metrics = metrics.Registry()
+        self.commands = self.metrics.register(metrics.Gauge(
+            'mixalot_pumpd_commands', 'Long commands waiting for a thread or running', ['command', 'state']))
+        self.pump_edges = self.metrics.register(metrics.Counter(
+            'mixalot_pump_edges_total', 'Power pin switches per pump', ['pump', 'edge']))
+        self.pump_on_seconds = self.metrics.register(metrics.Counter(
+            'mixalot_pump_on_seconds_total', 'Seconds each pump ran, counted when it switches off', ['pump']))
+        self.drinks = self.metrics.register(metrics.Counter(
+            'mixalot_drinks_dispensed_total', 'Pours per recipe', ['recipe', 'outcome']))
+        self.pour_seconds = self.metrics.register(metrics.Histogram(
+            'mixalot_pour_duration_seconds', 'First pump on to last pump off', ['outcome'], POUR_BUCKETS))
+        self.metrics.register(self.estop.latency)
+        self._pump_on_ns = {}  # pump_id -> timer time its power pin went on
+
+    # --- Serving ---
+
+    def start(self):
+        """Claim the pins and open the socket; serve_forever() then accepts clients."""
+        config = self.config_store.pumps()
+        if config:
+            print("Initializing pump GPIO pool...")
+            self.pool.sync(config)
+        if os.path.exists(self.socket_path):
+            if daemon_running(self.socket_path):
+                raise SystemExit(f"A pump daemon is already running on {self.socket_path}")
+            os.unlink(self.socket_path)  # Left behind by a daemon that died
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o666)  # The kiosk and the web app may run as other users
+        self._server.listen(16)
+        self.estop.listen()
+        print(f"Pump daemon listening on {self.socket_path}")
+
+    def serve_forever(self):
+        while True:
+            try:
+                sock, _ = self._server.accept()
+            except OSError:
+                return  # Closed
+            conn = Connection(self, sock)
+            with self._lock:
+                self._connections.add(conn)
+            threading.Thread(target=conn.serve, name='pumpd-connection', daemon=True).start()
+
+    def close(self):
+        """Stop every pump, close the socket and release the pins."""
+        if self._server is not None:
+            try:
+                self._server.shutdown(socket.SHUT_RDWR)  # Wakes accept()
+            except OSError:
+                pass
+            self._server.close()
+            self._server = None
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+        self.estop.close()
+        self.stop_commands()
+        self._executor.shutdown(wait=True)
+        print(f"{self.pool.close()} pump GPIO pairs released.")
+
+    def handle(self, conn, request):
+        """Answer one request; long commands run on their own thread."""
+        request_id = request.get('id')
+        command = request.get('cmd')
+        handler = getattr(self, f"cmd_{command}", None) if isinstance(command, str) else None
+        if handler is None:
+            conn.send({'id': request_id, 'ok': False, 'error': f"Unknown command '{command}'"})
+        elif command == 'dispense':
+            self.commands.inc(command=command, state='queued')
+            # Own thread, so it can get real-time priority without the pool threads keeping it
+            threading.Thread(target=self._answer, args=(conn, request_id, handler, request),
+                             name='pour', daemon=True).start()
+        elif command in LONG_COMMANDS:
+            self.commands.inc(command=command, state='queued')
+            self._executor.submit(self._answer, conn, request_id, handler, request)
+        else:
+            self._answer(conn, request_id, handler, request)
+
+    def _answer(self, conn, request_id, handler, request):
+        command = request.get('cmd')
+        long_command = command in LONG_COMMANDS
+        if long_command:
+            self.commands.dec(command=command, state='queued')
+            self.commands.inc(command=command, state='running')
+        try:
+            result = handler(conn, request)
+        except CommandError as e:
+            conn.send({'id': request_id, 'ok': False, 'error': str(e)})
+        except Exception as e:
+            print(f"  ! Error in '{request.get('cmd')}': {e}")
+            conn.send({'id': request_id, 'ok': False, 'error': f"Error: {e}"})
+        else:
+            conn.send({'id': request_id, 'ok': True, 'result': result})
+        finally:
+            if long_command:
+                self.commands.dec(command=command, state='running')
+
+    def disconnected(self, conn):
+        """Stop whatever the client left running."""
+        with self._lock:
+            self._connections.discard(conn)
+            stop_events = list(conn.stop_events)
+        for stop_event in stop_events:
+            stop_event.set()
+        if self._pour_owner is conn:
+            print("Client disconnected during a pour, stopping it")
+            self.engine.stop()
+
+    def publish(self, event, data):
+        """Send an event to every subscribed client."""
+        with self._lock:
+            connections = [conn for conn in self._connections if conn.subscribed]
+        for conn in connections:
+            conn.send({'event': event, 'data': data})
+
+    def publish_pin(self, device, value):
+        pump_id, role = self.pool.pump_for(device)
+        if pump_id is None:
+            return
+        if role == 'power':
+            self.count_edge(pump_id, value)
+            self.publish('pump', {'pump_id': pump_id, 'power': bool(value)})
+        else:
+            self.publish('pump', {'pump_id': pump_id, 'direction': direction_name(value)})
+
+    def count_edge(self, pump_id, value):
+        """Count a power edge and add the pump's run time when it switches off."""
+        now_ns = self.timer.now_ns()
+        if value:
+            self._pump_on_ns[pump_id] = now_ns
+            self.pump_edges.inc(pump=pump_id, edge='on')
+            return
+        on_ns = self._pump_on_ns.pop(pump_id, None)
+        if on_ns is not None:  # Already counted, e.g. by a stopped pour's cleanup
+            self.pump_edges.inc(pump=pump_id, edge='off')
+            self.pump_on_seconds.inc((now_ns - on_ns) / 1e9, pump=pump_id)
+
+    def stop_commands(self):
+        """Cut the pour and every test run and sweep."""
+        self.engine.stop()
+        with self._lock:
+            stop_events = list(self._stop_events)
+        for stop_event in stop_events:
+            stop_event.set()
+
+    def on_emergency_stop(self, source):
+        """Called once the pins are off: stop the commands and tell the clients."""
+        self.stop_commands()
+        self.publish('estop', {'source': source})
+
+    @contextlib.contextmanager
+    def stoppable(self, conn):
+        """A stop event for one command, set by an e-stop or when conn disconnects."""
+        stop_event = threading.Event()
+        with self._lock:
+            self._stop_events.add(stop_event)
+            conn.stop_events.add(stop_event)
+        try:
+            yield stop_event
+        finally:
+            with self._lock:
+                self._stop_events.discard(stop_event)
+                conn.stop_events.discard(stop_event)
+
+    def pump(self, pump_id):
+        """(power_pin, direction_pin) of a configured pump, following pumpen.json changes."""
+        config = self.config_store.pumps()
+        if not config:
+            raise CommandError('Failed to load configuration')
+        self.pool.sync(config)
+        power_pin, direction_pin = self.pool.get(pump_id)
+        if not power_pin or not direction_pin:
+            pump_config = self.config_store.get_pump(pump_id)
+            if not pump_config:
+                raise CommandError(f'Pump {pump_id} not found')
+            raise CommandError(f'Failed to setup GPIO for pump {pump_id} (Power: GPIO{pump_config["gpio_pin"]}, '
+                               f'Direction: GPIO{pump_config["direction_pin"]})')
+        return power_pin, direction_pin
+
+    # --- Commands: cmd_<name>(conn, request) returns the result ---
+
+    def cmd_ping(self, conn, request):
+        return {'pid': os.getpid()}
+
+    def cmd_status(self, conn, request):
+        pumps = []
+        for pump_id, (power_pin, direction_pin) in self.pool.items():
+            try:
+                pumps.append({
+                    'pump_id': pump_id,
+                    'power': bool(power_pin.value),
+                    'direction': direction_name(direction_pin.value),
+                    'busy': self.pool.pump_lock(pump_id).locked(),
+                })
+            except Exception as e:
+                print(f"  ! Error reading state of Pump {pump_id}: {e}")
+        return {'pumps': pumps, 'pouring': self._pour_lock.locked()}
+
+    def cmd_subscribe(self, conn, request):
+        conn.subscribed = True
+        return self.cmd_status(conn, request)
+
+    def cmd_sync(self, conn, request):
+        config = self.config_store.pumps()
+        if not config:
+            raise CommandError('Failed to load configuration')
+        return {'rebuilt': self.pool.sync(config)}
+
+    def cmd_run(self, conn, request):
+        pump_id = request.get('pump_id')
+        level = direction_level(request.get('direction', 'forward'))
+        duration = float(request.get('duration', pump_sweep.TEST_DURATION_SECONDS))
+        if not 0 < duration <= MAX_RUN_SECONDS:
+            raise CommandError(f'Duration must be between 0 and {MAX_RUN_SECONDS}s')
+        power_pin, direction_pin = self.pump(pump_id)
+        pump_lock = self.pool.pump_lock(pump_id)
+        if not pump_lock.acquire(blocking=False):
+            raise CommandError(f'Pump {pump_id} is already running')
+        try:
+            with self.stoppable(conn) as stop_event:
+                if not self.slots.acquire(stop_event):
+                    return {'stopped': True}
+                try:
+                    stopped = pump_sweep.run_pump(self.timer, power_pin, direction_pin, level, duration,
+                                                  stop_event, on_direction=self.publish_pin)
+                except Exception:
+                    power_pin.off()
+                    raise
+                finally:
+                    self.slots.release()
+        finally:
+            pump_lock.release()
+        return {'stopped': stopped}
+
+    def cmd_sweep(self, conn, request):
+        max_parallel = min(int(request.get('max_parallel', self.max_parallel)), self.max_parallel)
+        duration = float(request.get('duration', pump_sweep.TEST_DURATION_SECONDS))
+        if max_parallel < 1 or not 0 < duration <= MAX_RUN_SECONDS:
+            raise CommandError(f'max_parallel must be at least 1 and duration between 0 and {MAX_RUN_SECONDS}s')
+        config = self.config_store.pumps()
+        if not config:
+            raise CommandError('Failed to load configuration')
+        self.pool.sync(config)
+        pumps = [(pump_id, power_pin, direction_pin)
+                 for pump_id, (power_pin, direction_pin) in self.pool.items()]
+        request_id = request.get('id')
+        with self.stoppable(conn) as stop_event:
+            summary = pump_sweep.sweep(
+                self.timer, pumps, max_parallel, duration, stop_event,
+                lambda result: conn.send({'id': request_id, 'event': 'sweep_result', 'data': result}),
+                self.pool.pump_lock, self.publish_pin, self.slots)
+            summary['stopped'] = stop_event.is_set()
+        return summary
+
+    def set_directions(self, directions, stop_event):
+        """Set every direction pin to its level, then let changed pins settle.
+
+        directions is a list of (direction_pin, level). Like run_pump, only
+        a change waits DIRECTION_SETTLE_SECONDS before any pump may start.
+        """
+        changed = False
+        for direction_pin, level in directions:
+            if direction_pin.value != level:
+                direction_pin.value = level
+                self.publish_pin(direction_pin, level)
+                changed = True
+        if changed:
+            settled_ns = self.timer.now_ns() + int(pump_sweep.DIRECTION_SETTLE_SECONDS * 1e9)
+            self.timer.wait_until(settled_ns, stop_event)
+
+    def cmd_dispense(self, conn, request):
+        request_id = request.get('id')
+        epoch = self.engine.epoch  # An e-stop from now on cancels this pour, even before it starts
+        jobs = []
+        directions = {}  # pump_id -> (direction_pin, level)
+        for item in request.get('jobs', []):
+            pump_id = item.get('pump_id')
+            level = direction_level(item.get('direction', 'forward'))
+            try:
+                power_pin, direction_pin = self.pump(pump_id)
+            except CommandError as e:
+                # Pour the rest, like a recipe with an ingredient that has no pump
+                conn.send({'id': request_id, 'event': 'skipped',
+                           'data': {'name': item.get('name'), 'pump_id': pump_id, 'reason': str(e)}})
+                continue
+            if directions.setdefault(pump_id, (direction_pin, level))[1] != level:
+                raise CommandError(f'Pump {pump_id} cannot run both ways in one pour')
+            jobs.append((pump_id, PumpJob(item.get('name'), power_pin, float(item['duration']))))
+        if not self._pour_lock.acquire(blocking=False):
+            raise CommandError('A drink is already pouring')
+        pump_locks = []
+        try:
+            for pump_id in {pump_id for pump_id, _ in jobs}:
+                pump_lock = self.pool.pump_lock(pump_id)
+                if not pump_lock.acquire(blocking=False):
+                    raise CommandError(f'Pump {pump_id} is busy')
+                pump_locks.append(pump_lock)
+            if self._rt_priority is not None and not set_realtime_priority(self._rt_priority):
+                self._rt_priority = None  # No CAP_SYS_NICE; later pours would fail and log the same way
+            self._pour_owner = conn
+            print(f"Pouring {request.get('name')}")
+            # A sweep or backward test leaves direction pins at backward; never pour back into the bottles
+            with self.stoppable(conn) as stop_event:
+                self.set_directions(list(directions.values()), stop_event)
+            result = self.engine.dispense(
+                [job for _, job in jobs], epoch=epoch, slots=self.slots,
+                on_job_done=lambda job: conn.send({'id': request_id, 'event': 'pump_done',
+                                                   'data': {'name': job.name, 'seconds': job.actual_duration}}))
+            outcome = 'stopped' if result.stopped else 'completed'
+            self.drinks.inc(recipe=request.get('name'), outcome=outcome)
+            self.pour_seconds.observe(result.elapsed, outcome=outcome)
+            return result.to_dict()
+        finally:
+            for pump_id, job in jobs:
+                if job.started_at is not None and pump_id in self._pump_on_ns:
+                    self.publish_pin(job.pump, 0)  # Switched off by a stopped pour, which reports no edge
+            self._pour_owner = None
+            for pump_lock in pump_locks:
+                pump_lock.release()
+            self._pour_lock.release()
+
+    def cmd_progress(self, conn, request):
+        overall, per_pump = self.engine.progress()
+        return {'overall': overall, 'pumps': per_pump}
+
+    def cmd_stop(self, conn, request):
+        print("\nNOT-STOP: Stopping all pumps...")
+        return {'processes': self.estop.trigger(request.get('source', 'client'), wait=estop.REPLY_TIMEOUT)}
+
+    def cmd_timing(self, conn, request):
+        return {
+            'summary': self.timer.stats.summary(),
+            'histogram': [{'le_us': bound, 'count': count}
+                          for bound, count in self.timer.stats.histogram()],
+            'estop': self.estop.summary(),
+        }
+
+    def cmd_metrics(self, conn, request):
+        return {'text': self.metrics.render()}
+
+
+def exit_on_sigterm(signum, frame):
+    """systemd stops services with SIGTERM; leave through main()'s cleanup."""
+    raise SystemExit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pump daemon: owns the pump GPIO pins.')
+    parser.add_argument('--config', default=CONFIG_FILE, help='pump configuration file')
+    parser.add_argument('--socket', default=SOCKET_PATH, help='Unix socket to listen on')
+    parser.add_argument('--ping', action='store_true', help='only check whether a daemon answers')
+    args = parser.parse_args()
+
+    if args.ping:
+        raise SystemExit(0 if daemon_running(args.socket) else 1)
+
+    # Set lgpio (or the simulated backend, see hardware.py) as the default pin factory
+    hardware.setup_pin_factory()
+    daemon = PumpDaemon(args.config, args.socket)
+    signal.signal(signal.SIGTERM, exit_on_sigterm)
+    daemon.start()
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.close()
+
+
+if __name__ == '__main__':
+    main()
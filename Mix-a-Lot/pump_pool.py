@@ -0,0 +1,151 @@
+"""Process-wide pool of pump GPIO devices.
+
+Claiming an lgpio line is slow compared to switching it, so the pump
+devices are built once and kept for the life of the process. sync()
+brings the pool in line with the configuration and only rebuilds pumps
+whose pins actually changed (e.g. after /swap-pins).
+
+PumpSlots is the power supply's budget: whatever switches a pump on
+holds one of its slots until the pump is off again, so pours, sweeps and
+test runs together never run more pumps than safety.max_parallel_pumps.
+"""
+import threading
+
+SLOT_POLL_SECONDS = 0.05  # How often a command waiting for a slot checks its stop event
+
+
+class PumpSlots:
+    """At most `limit` pumps on at once, shared by every command."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._condition = threading.Condition()
+        self._in_use = 0
+
+    @property
+    def in_use(self):
+        return self._in_use
+
+    def acquire(self, stop_event=None):
+        """Wait for a free slot; returns False if stop_event was set first."""
+        with self._condition:
+            while True:
+                if stop_event is not None and stop_event.is_set():
+                    return False
+                if self._in_use < self.limit:
+                    self._in_use += 1
+                    return True
+                self._condition.wait(SLOT_POLL_SECONDS)
+
+    def try_acquire(self):
+        """Take a slot if one is free, without waiting."""
+        with self._condition:
+            if self._in_use >= self.limit:
+                return False
+            self._in_use += 1
+            return True
+
+    def release(self, count=1):
+        if count <= 0:
+            return
+        with self._condition:
+            self._in_use -= count
+            self._condition.notify(count)
+
+
+class PumpPool:
+    """Keeps one (power_pin, direction_pin) device pair per pump id."""
+
+    def __init__(self, setup_pump_gpio):
+        # setup_pump_gpio(pump_config) -> (power_pin, direction_pin) or (None, None)
+        self._setup_pump_gpio = setup_pump_gpio
+        self._lock = threading.RLock()
+        self._devices = {}     # pump_id -> (power_pin, direction_pin)
+        self._pins = {}        # pump_id -> (gpio_pin, direction_pin) the devices were built for
+        self._pump_locks = {}  # pump_id -> Lock held while the pump is running
+
+    def sync(self, pump_configs):
+        """Create, rebuild or release devices so the pool matches pump_configs.
+
+        Returns the ids of the pumps that were (re)built.
+        """
+        rebuilt = []
+        with self._lock:
+            wanted = {p.get('id'): p for p in pump_configs}
+            for pump_id in list(self._devices):
+                if pump_id not in wanted:
+                    self._release(pump_id)
+
+            for pump_id, pump_config in wanted.items():
+                pins = (pump_config.get('gpio_pin'), pump_config.get('direction_pin'))
+                if self._pins.get(pump_id) == pins:
+                    continue
+                # Release first: after a swap the new pins are the old ones reversed
+                self._release(pump_id)
+                power_pin, direction_pin = self._setup_pump_gpio(pump_config)
+                if not power_pin or not direction_pin:
+                    for device in (power_pin, direction_pin):
+                        if device:
+                            device.close()
+                    continue
+                self._devices[pump_id] = (power_pin, direction_pin)
+                self._pins[pump_id] = pins
+                self._pump_locks.setdefault(pump_id, threading.Lock())
+                rebuilt.append(pump_id)
+        return rebuilt
+
+    def get(self, pump_id):
+        """Return (power_pin, direction_pin) for a pump, or (None, None)."""
+        with self._lock:
+            return self._devices.get(pump_id, (None, None))
+
+    def pump_lock(self, pump_id):
+        """Lock to hold while running a pump, so two requests cannot drive it at once."""
+        with self._lock:
+            return self._pump_locks.setdefault(pump_id, threading.Lock())
+
+    def pump_for(self, device):
+        """Return (pump_id, 'power' or 'direction') for one of the pool's devices."""
+        with self._lock:
+            for pump_id, (power_pin, direction_pin) in self._devices.items():
+                if device is power_pin:
+                    return pump_id, 'power'
+                if device is direction_pin:
+                    return pump_id, 'direction'
+        return None, None
+
+    def items(self):
+        """Snapshot of (pump_id, (power_pin, direction_pin)) pairs."""
+        with self._lock:
+            return list(self._devices.items())
+
+    def stop_all(self):
+        """Switch every pump off; returns how many were stopped."""
+        stopped_count = 0
+        for pump_id, (power_pin, _) in self.items():
+            try:
+                power_pin.off()
+                stopped_count += 1
+            except Exception as e:
+                print(f"  ! Error stopping Pump {pump_id}: {e}")
+        return stopped_count
+
+    def close(self):
+        """Release all devices; returns how many pumps were released."""
+        with self._lock:
+            pump_ids = list(self._devices)
+            for pump_id in pump_ids:
+                self._release(pump_id)
+        return len(pump_ids)
+
+    def _release(self, pump_id):
+        devices = self._devices.pop(pump_id, None)
+        self._pins.pop(pump_id, None)
+        if not devices:
+            return
+        for device in devices:
+            try:
+                device.off()
+                device.close()
+            except Exception as e:
+                print(f"  ! Error closing pins for Pump {pump_id}: {e}")
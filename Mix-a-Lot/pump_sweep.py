@@ -0,0 +1,225 @@
+"""Diagnostic sweep: run every pump forward and backward, several at once.
+
+test_8-pumpen.py tests one pump after another with pauses in between,
+which takes minutes after every line swap. A sweep runs up to
+max_parallel pumps at the same time (at most safety.max_parallel_pumps
+from pumpen.json, the power supply limit), reports each pump as soon as
+it is done and the total sweep time at the end. Used by the pump
+daemon's sweep command (the web app's /sweep) and on its own, through
+the daemon if it is running, else on pins claimed here:
+
+    python3 pump_sweep.py [--max-parallel N] [--duration S] [--config pumpen.json]
+"""
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import hardware
+
+FORWARD_LEVEL = 0    # Level for forward direction
+BACKWARD_LEVEL = 1   # Level for backward direction
+TEST_DURATION_SECONDS = 1.0  # Duration for each direction
+DELAY_BETWEEN_DIRECTIONS = 0.5  # Pause between forward and backward
+DIRECTION_SETTLE_SECONDS = 0.1  # Pause after changing direction before the pump starts
+
+
+def run_pump(timer, power_pin, direction_pin, level, duration, stop_event=None, on_direction=None):
+    """Set the direction, then run the pump for exactly duration seconds.
+
+    on_direction(direction_pin, level) is called when the direction changed.
+    Returns True if stop_event cut the run short.
+    """
+    start_ns = timer.now_ns()
+    if direction_pin.value != level:
+        direction_pin.value = level  # Set direction
+        if on_direction:
+            on_direction(direction_pin, level)
+        # Only a direction change needs time to settle before the pump starts
+        start_ns += int(DIRECTION_SETTLE_SECONDS * 1e9)
+    return timer.run(power_pin, duration, stop_event=stop_event, start_ns=start_ns)
+
+
+def sweep_pump(timer, pump_id, power_pin, direction_pin, duration=TEST_DURATION_SECONDS,
+               stop_event=None, on_direction=None):
+    """Run one pump forward, pause, then backward, and point it forward again.
+
+    Returns a result dict.
+    """
+    clock = timer.clock
+    started = clock.monotonic()
+    steps = ((FORWARD_LEVEL, 'forward'), (BACKWARD_LEVEL, 'backward'))
+    try:
+        for i, (level, name) in enumerate(steps):
+            if i:
+                timer.wait_until(timer.now_ns() + int(DELAY_BETWEEN_DIRECTIONS * 1e9), stop_event)
+            if run_pump(timer, power_pin, direction_pin, level, duration, stop_event, on_direction):
+                return {'pump_id': pump_id, 'ok': False, 'message': f'Stopped during {name} run',
+                        'seconds': clock.monotonic() - started}
+    except Exception as e:
+        power_pin.off()
+        return {'pump_id': pump_id, 'ok': False, 'message': f'Error: {e}',
+                'seconds': clock.monotonic() - started}
+    finally:
+        # The power pin is off by now; leave the pump pointing forward, ready to pour
+        try:
+            if direction_pin.value != FORWARD_LEVEL:
+                direction_pin.value = FORWARD_LEVEL
+                if on_direction:
+                    on_direction(direction_pin, FORWARD_LEVEL)
+        except Exception as e:
+            print(f"  ! Cannot set Pump {pump_id} back to forward: {e}")
+    return {'pump_id': pump_id, 'ok': True, 'message': 'Forward and backward OK',
+            'seconds': clock.monotonic() - started}
+
+
+def sweep(timer, pumps, max_parallel, duration=TEST_DURATION_SECONDS,
+          stop_event=None, on_result=None, pump_lock=None, on_direction=None, slots=None):
+    """Sweep pumps, a list of (pump_id, power_pin, direction_pin), max_parallel at a time.
+
+    on_result(result) is called as each pump finishes. pump_lock(pump_id),
+    if given, returns a lock held while that pump runs; a pump whose lock
+    is taken (e.g. a manual test) is reported as busy instead of run.
+    slots (a pump_pool.PumpSlots shared with other commands) must grant
+    each pump a slot before it runs.
+    Returns a summary with every result and the total sweep time.
+
+    On a virtual clock the pumps run one at a time: every sleep advances
+    the one shared clock, so concurrent pumps would skew each other's
+    timelines.
+    """
+    stop_event = stop_event or threading.Event()
+    clock = timer.clock
+    if clock.virtual:
+        max_parallel = 1
+    started = clock.monotonic()
+
+    def run_one(pump_id, power_pin, direction_pin):
+        if stop_event.is_set():
+            return {'pump_id': pump_id, 'ok': False, 'message': 'Not run, sweep stopped', 'seconds': 0.0}
+        lock = pump_lock(pump_id) if pump_lock else None
+        if lock is not None and not lock.acquire(blocking=False):
+            return {'pump_id': pump_id, 'ok': False, 'message': 'Busy, not tested', 'seconds': 0.0}
+        try:
+            if slots is not None and not slots.acquire(stop_event):
+                return {'pump_id': pump_id, 'ok': False, 'message': 'Not run, sweep stopped', 'seconds': 0.0}
+            try:
+                return sweep_pump(timer, pump_id, power_pin, direction_pin, duration, stop_event, on_direction)
+            finally:
+                if slots is not None:
+                    slots.release()
+        finally:
+            if lock is not None:
+                lock.release()
+
+    results = []
+    with ThreadPoolExecutor(max(1, max_parallel), thread_name_prefix='sweep') as pool:
+        futures = [pool.submit(run_one, *pump) for pump in pumps]
+        try:
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if on_result:
+                    on_result(result)
+        except BaseException:
+            stop_event.set()  # E.g. Ctrl+C: stop the running pumps before waiting for them
+            raise
+
+    total = clock.monotonic() - started
+    return {
+        'results': sorted(results, key=lambda r: str(r['pump_id'])),
+        'passed': sum(1 for r in results if r['ok']),
+        'failed': sum(1 for r in results if not r['ok']),
+        'max_parallel': max_parallel,
+        'total_seconds': total,
+        'serial_seconds': sum(r['seconds'] for r in results),  # Same runs one pump at a time
+    }
+
+
+def sweep_locally(pump_configs, max_parallel, duration, report):
+    """Claim the pins in this process and sweep; for bring-up without the pump daemon."""
+    from gpiozero import DigitalOutputDevice
+    from estop import EmergencyStop
+    from pump_pool import PumpPool
+    from pump_timing import EdgeTimer
+
+    hardware.setup_pin_factory()
+
+    def setup_pump_gpio(pump_config):
+        try:
+            return (DigitalOutputDevice(pump_config['gpio_pin'], initial_value=False),
+                    DigitalOutputDevice(pump_config['direction_pin'], initial_value=False))
+        except Exception as e:
+            print(f"  ! Cannot set up Pump {pump_config.get('id')}: {e}")
+            return None, None
+
+    pool = PumpPool(setup_pump_gpio)
+    pool.sync(pump_configs)
+    pumps = [(pump_id, power_pin, direction_pin) for pump_id, (power_pin, direction_pin) in pool.items()]
+    stop_event = threading.Event()
+    # The web app's and the kiosk's emergency stop reach this sweep too
+    estop = EmergencyStop('sweep', lambda: [power_pin for _, power_pin, _ in pumps])
+    estop.on_stop(lambda source: stop_event.set())
+    estop.listen()
+    try:
+        return sweep(EdgeTimer(), pumps, max_parallel, duration, stop_event, report)
+    except KeyboardInterrupt:
+        stop_event.set()
+        pool.stop_all()
+        raise
+    finally:
+        estop.close()
+        pool.close()
+
+
+def main():
+    from config_store import ConfigStore
+    from pump_client import PumpClient, PumpDaemonError, daemon_running
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--max-parallel', type=int,
+                        help='pumps run at once (default: safety.max_parallel_pumps in the config)')
+    parser.add_argument('--duration', type=float, default=TEST_DURATION_SECONDS, help='seconds per direction')
+    parser.add_argument('--config', default='pumpen.json', help='pump configuration file')
+    args = parser.parse_args()
+
+    config_store = ConfigStore(args.config)
+    pump_configs = config_store.pumps()
+    if not pump_configs:
+        raise SystemExit(f"No pumps in {args.config}")
+    limit = config_store.max_parallel_pumps()
+    if args.max_parallel is None or args.max_parallel > limit:
+        args.max_parallel = limit  # The daemon caps it the same way
+    liquids = {p.get('id'): p.get('assigned_liquid', '') for p in pump_configs}
+
+    def report(result):
+        status = 'OK  ' if result['ok'] else 'FAIL'
+        print(f"  {status} Pump {result['pump_id']} ({liquids.get(result['pump_id'])}): "
+              f"{result['message']} in {result['seconds']:.2f}s")
+
+    print(f"Sweeping {len(pump_configs)} pumps, {args.max_parallel} at once, "
+          f"{args.duration}s per direction...")
+    client = None
+    try:
+        if daemon_running():
+            # The daemon owns the pins; the sweep runs there
+            client = PumpClient()
+            summary = client.call('sweep', timeout=None, on_progress=lambda event, result: report(result),
+                                  max_parallel=args.max_parallel, duration=args.duration)
+        else:
+            summary = sweep_locally(pump_configs, args.max_parallel, args.duration, report)
+    except KeyboardInterrupt:
+        # A local sweep has stopped its pumps; the daemon stops a disconnected client's sweep
+        print("\nEMERGENCY STOP: sweep cancelled (Ctrl+C)")
+        raise SystemExit(1)
+    except PumpDaemonError as e:
+        raise SystemExit(f"Sweep failed: {e}")
+    finally:
+        if client is not None:
+            client.close()
+    print(f"\n{summary['passed']} passed, {summary['failed']} failed in {summary['total_seconds']:.2f}s "
+          f"(one at a time: {summary['serial_seconds']:.2f}s)")
+    raise SystemExit(0 if summary['failed'] == 0 else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""High-precision timing of pump on/off edges.
+
+Pump run time is poured volume: at 1.5 ml/s every 100 ms of timing error
+is 0.15 ml too much or too little. time.sleep alone oversleeps by an
+unpredictable amount when the Pi is busy, so EdgeTimer sleeps until
+shortly before a deadline and busy-waits the last stretch against
+time.monotonic_ns. Every edge's planned-vs-actual error is recorded in an
+EdgeStats histogram so pour accuracy can be checked on real hardware.
+"""
+import bisect
+import collections
+import os
+import threading
+
+import hardware
+
+SPIN_WINDOW_NS = 2_000_000  # Busy-wait the last 2 ms before a deadline
+# Upper bounds (microseconds) of the absolute-error histogram buckets
+HISTOGRAM_BUCKETS_US = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+
+
+class EdgeStats:
+    """Thread-safe record of planned-vs-actual error for pump edges."""
+
+    def __init__(self, keep=10000):
+        self._lock = threading.Lock()
+        self._errors_ns = collections.deque(maxlen=keep)  # Signed, late is positive
+        self._bucket_counts = [0] * (len(HISTOGRAM_BUCKETS_US) + 1)
+        self._count = 0
+
+    def record(self, planned_ns, actual_ns):
+        """Record one edge; returns its error in nanoseconds."""
+        error = actual_ns - planned_ns
+        bucket = bisect.bisect_left(HISTOGRAM_BUCKETS_US, abs(error) / 1000)
+        with self._lock:
+            self._errors_ns.append(error)
+            self._bucket_counts[bucket] += 1
+            self._count += 1
+        return error
+
+    def histogram(self):
+        """Return [(upper_bound_us, count), ...]; the last bound is None (overflow)."""
+        with self._lock:
+            counts = list(self._bucket_counts)
+        bounds = list(HISTOGRAM_BUCKETS_US) + [None]
+        return list(zip(bounds, counts))
+
+    def summary(self):
+        """Return count, mean and percentiles of the recent edge errors in microseconds."""
+        with self._lock:
+            errors = sorted(self._errors_ns)
+            count = self._count
+        if not errors:
+            return {'count': count}
+
+        def percentile(p):
+            return errors[min(int(len(errors) * p), len(errors) - 1)] / 1000
+
+        return {
+            'count': count,
+            'mean_us': sum(errors) / len(errors) / 1000,
+            'p50_us': percentile(0.50),
+            'p95_us': percentile(0.95),
+            'p99_us': percentile(0.99),
+            'max_us': max(errors, key=abs) / 1000,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._errors_ns.clear()
+            self._bucket_counts = [0] * (len(HISTOGRAM_BUCKETS_US) + 1)
+            self._count = 0
+
+
+class EdgeTimer:
+    """Switches pump pins at monotonic_ns deadlines and records the error."""
+
+    def __init__(self, stats=None, spin_window_ns=SPIN_WINDOW_NS, clock=None, on_edge=None):
+        self.stats = stats or EdgeStats()
+        self.clock = clock or hardware.clock
+        self.on_edge = on_edge  # on_edge(device, value), called after every switch
+        # A virtual clock only moves when slept on, so it must never spin
+        self.spin_window_ns = 0 if self.clock.virtual else spin_window_ns
+
+    def now_ns(self):
+        return self.clock.monotonic_ns()
+
+    def wait_until(self, deadline_ns, stop_event=None):
+        """Block until deadline_ns. Returns True if stop_event was set meanwhile."""
+        while True:
+            remaining = deadline_ns - self.clock.monotonic_ns()
+            if remaining <= self.spin_window_ns:
+                break
+            timeout = (remaining - self.spin_window_ns) / 1e9
+            if stop_event is not None:
+                if self.clock.wait(stop_event, timeout):
+                    return True
+            else:
+                self.clock.sleep(timeout)
+        # Busy-wait the last stretch; sleep(0) still lets other threads run
+        while self.clock.monotonic_ns() < deadline_ns:
+            if stop_event is not None and stop_event.is_set():
+                return True
+            self.clock.sleep(0)
+        return stop_event is not None and stop_event.is_set()
+
+    def edge(self, device, value, planned_ns):
+        """Set device to value now and record the error against planned_ns.
+
+        Returns the actual time of the edge in monotonic nanoseconds.
+        """
+        device.value = value
+        actual_ns = self.clock.monotonic_ns()
+        self.stats.record(planned_ns, actual_ns)
+        if self.on_edge:
+            self.on_edge(device, value)
+        return actual_ns
+
+    def run(self, power_pin, duration, stop_event=None, start_ns=None):
+        """Switch power_pin on at start_ns (default now) and off duration seconds later.
+
+        Returns True if the run was cut short by stop_event.
+        """
+        if start_ns is None:
+            start_ns = self.clock.monotonic_ns()
+        stopped = self.wait_until(start_ns, stop_event)
+        if stopped:
+            return True
+        on_ns = self.edge(power_pin, 1, start_ns)
+        # The off deadline follows the real on edge so the run time is exact
+        off_ns = on_ns + int(duration * 1e9)
+        stopped = True
+        try:
+            stopped = self.wait_until(off_ns, stop_event)
+        finally:
+            if stopped:
+                power_pin.off()  # Cut short: not a scheduled edge, keep it out of the stats
+                if self.on_edge:
+                    self.on_edge(power_pin, 0)
+            else:
+                self.edge(power_pin, 0, off_ns)
+        return stopped
+
+
+def set_realtime_priority(priority):
+    """Try to move the calling thread to SCHED_FIFO with the given priority.
+
+    Needs CAP_SYS_NICE (or root); returns True on success and False
+    otherwise, so callers can carry on without real-time scheduling.
+    """
+    if not hasattr(os, 'sched_setscheduler'):
+        return False
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        return True
+    except (OSError, ValueError) as e:
+        print(f"Real-time priority not available: {e}")
+        return False
@@ -0,0 +1,170 @@
+"""Compile cocktails.json into validated pump dose plans.
+
+A dose plan says, for one cocktail, which pump runs for how long and in
+which direction. Plans are compiled once and cached; they are rebuilt
+only when cocktails.json or pump_config.json change on disk, so starting
+a pour is a dictionary lookup.
+"""
+import json
+import re
+
+from config_store import file_signature
+
+# Millilitres per unit. A dash is the usual bar measure of 1/32 fl oz.
+UNIT_TO_ML = {
+    'oz': 29.5735,
+    'ml': 1.0,
+    'cl': 10.0,
+    'dash': 29.5735 / 32,
+}
+UNIT_ALIASES = {
+    'ounce': 'oz', 'ounces': 'oz',
+    'milliliter': 'ml', 'milliliters': 'ml', 'millilitre': 'ml', 'millilitres': 'ml',
+    'centiliter': 'cl', 'centiliters': 'cl', 'centilitre': 'cl', 'centilitres': 'cl',
+    'dashes': 'dash',
+}
+AMOUNT_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?|\d+/\d+)\s*([a-zA-Z]+)\s*$')
+
+
+def parse_amount(amount):
+    """Convert an amount such as '2 oz', '1.5cl' or '2 dashes' to millilitres.
+
+    Raises ValueError for anything that cannot be parsed.
+    """
+    match = AMOUNT_PATTERN.match(amount)
+    if not match:
+        raise ValueError(f"Cannot parse amount '{amount}'")
+    number, unit = match.groups()
+    if '/' in number:
+        numerator, denominator = number.split('/')
+        value = float(numerator) / float(denominator)
+    else:
+        value = float(number)
+    unit = unit.lower()
+    unit = UNIT_ALIASES.get(unit, unit)
+    if unit not in UNIT_TO_ML:
+        raise ValueError(f"Unknown unit '{unit}' in amount '{amount}'")
+    return value * UNIT_TO_ML[unit]
+
+
+class DoseStep:
+    """One ingredient of a plan: pump, volume, run time and direction."""
+
+    def __init__(self, ingredient, pump_name, pump_key, ml, duration, direction='forward'):
+        self.ingredient = ingredient  # Name as written in cocktails.json
+        self.pump_name = pump_name    # e.g. 'Pump 3' from pump_config.json
+        self.pump_key = pump_key      # Lower-case liquid name the kiosk keys its pumps by
+        self.ml = ml
+        self.duration = duration
+        self.direction = direction
+
+
+class DosePlan:
+    """Compiled, validated pour plan for one cocktail."""
+
+    def __init__(self, name, steps, missing, scale):
+        self.name = name
+        self.steps = steps      # DoseStep per pumpable ingredient
+        self.missing = missing  # Ingredients that have no pump and are not poured
+        self.scale = scale      # Factor applied to the recipe to reach the target volume
+
+    @property
+    def volume(self):
+        """Millilitres the pumps will pour."""
+        return sum(step.ml for step in self.steps)
+
+
+def compile_recipe(cocktail, pumps_by_liquid, target_volume, flow_rate):
+    """Compile one cocktails.json entry into a DosePlan.
+
+    pumps_by_liquid maps lower-case liquid names to pump names, flow_rate
+    is in ml per minute. Raises ValueError if an amount cannot be parsed.
+    """
+    volumes = {ingredient: parse_amount(amount)
+               for ingredient, amount in cocktail['ingredients'].items()}
+    total = sum(volumes.values())
+    # Scale on the full recipe so the proportions stay right even when some
+    # ingredients have to be added by hand.
+    scale = target_volume / total if total > 0 else 1.0
+
+    steps = []
+    missing = []
+    for ingredient, ml in volumes.items():
+        key = ingredient.lower()
+        pump_name = pumps_by_liquid.get(key)
+        if pump_name is None:
+            missing.append(ingredient)
+            continue
+        ml *= scale
+        steps.append(DoseStep(ingredient, pump_name, key, ml, ml / flow_rate * 60))
+    return DosePlan(cocktail['normal_name'], steps, missing, scale)
+
+
+def compile_recipes(cocktails, pump_config, target_volume, flow_rate):
+    """Compile all cocktails; returns {normal_name: DosePlan}.
+
+    Cocktails that fail to compile are reported and left out.
+    """
+    pumps_by_liquid = {liquid.lower(): pump_name for pump_name, liquid in pump_config.items()}
+    plans = {}
+    for cocktail in cocktails:
+        name = cocktail.get('normal_name', '?')
+        try:
+            plan = compile_recipe(cocktail, pumps_by_liquid, target_volume, flow_rate)
+        except (KeyError, ValueError) as e:
+            print(f"  ! Recipe '{name}' skipped: {e}")
+            continue
+        if plan.missing:
+            print(f"  ! Recipe '{name}': no pump for {', '.join(plan.missing)} (add by hand)")
+        plans[name] = plan
+    return plans
+
+
+class RecipeBook:
+    """Cache of compiled dose plans that follows its source files."""
+
+    def __init__(self, cocktails_file, pump_config_file, target_volume, flow_rate):
+        self.cocktails_file = cocktails_file
+        self.pump_config_file = pump_config_file
+        self.target_volume = target_volume
+        self.flow_rate = flow_rate
+        self._signature = None
+        self._plans = {}
+
+    def _current_signature(self):
+        return file_signature(self.cocktails_file), file_signature(self.pump_config_file)
+
+    def refresh(self):
+        """Recompile if either source file changed. Returns True if it did."""
+        try:
+            signature = self._current_signature()
+        except OSError as e:
+            print(f"Error checking recipe files: {e}")
+            return False
+        if signature == self._signature:
+            return False
+
+        try:
+            with open(self.cocktails_file, 'r') as f:
+                cocktails = json.load(f)['cocktails']
+            with open(self.pump_config_file, 'r') as f:
+                pump_config = json.load(f)
+        except (OSError, ValueError, KeyError) as e:
+            # Keep serving the last good plans
+            print(f"Error loading recipe files, keeping previous plans: {e}")
+            return False
+
+        print("Compiling recipes...")
+        self._plans = compile_recipes(cocktails, pump_config, self.target_volume, self.flow_rate)
+        self._signature = signature
+        return True
+
+    def plans(self):
+        """All compiled plans as {normal_name: DosePlan}."""
+        self.refresh()
+        return dict(self._plans)
+
+    def get(self, name):
+        """Return the DosePlan for a cocktail name, or None if it has none."""
+        self.refresh()
+        return self._plans.get(name)
@@ -0,0 +1,267 @@
+"""Caches for the pygame kiosk renderer.
+
+pygame.font.SysFont searches the system font list on every call, which
+is slow on the Pi, and font.render rasterises the text every time. The
+kiosk draws the same few strings at the same few sizes frame after
+frame, so both are cached here with LRU eviction. Drink images are
+loaded on demand into a memory-bounded cache, so large menus neither
+fill the Pi's RAM nor delay startup.
+"""
+import collections
+import queue
+import threading
+
+import pygame
+
+
+class TextCache:
+    """LRU cache of fonts by size and of rendered text surfaces."""
+
+    def __init__(self, max_fonts=32, max_surfaces=256, font_name=None):
+        self.font_name = font_name  # None is pygame's default font
+        self.max_fonts = max_fonts
+        self.max_surfaces = max_surfaces
+        self._fonts = collections.OrderedDict()     # size -> Font
+        self._surfaces = collections.OrderedDict()  # (text, size, color) -> Surface
+        self.font_hits = 0
+        self.font_misses = 0
+        self.text_hits = 0
+        self.text_misses = 0
+
+    def font(self, size):
+        """Return the font for a point size, creating it on first use."""
+        font = self._fonts.get(size)
+        if font is not None:
+            self._fonts.move_to_end(size)
+            self.font_hits += 1
+            return font
+        self.font_misses += 1
+        font = pygame.font.SysFont(self.font_name, size)
+        self._fonts[size] = font
+        if len(self._fonts) > self.max_fonts:
+            self._fonts.popitem(last=False)
+        return font
+
+    def render(self, text, size, color):
+        """Return an antialiased surface of text; treat it as read-only."""
+        key = (text, size, tuple(color))
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            self.text_hits += 1
+            return surface
+        self.text_misses += 1
+        surface = self.font(size).render(text, True, color)
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self.max_surfaces:
+            self._surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self._fonts.clear()
+        self._surfaces.clear()
+
+    def stats(self):
+        """Hit/miss counters; misses that keep growing mean per-frame font work."""
+        return {
+            'font_hits': self.font_hits,
+            'font_misses': self.font_misses,
+            'text_hits': self.text_hits,
+            'text_misses': self.text_misses,
+            'fonts_cached': len(self._fonts),
+            'surfaces_cached': len(self._surfaces),
+        }
+
+
+class FrameCache:
+    """Pre-composited, screen-sized static frames built on demand.
+
+    build(index) paints everything that does not move for one cocktail
+    into a new surface. Frames are kept in an LRU of max_frames entries
+    and rebuilt only after invalidate() (config or assets changed).
+    """
+
+    def __init__(self, build, max_frames=16):
+        self._build = build
+        self.max_frames = max_frames
+        self._frames = collections.OrderedDict()  # index -> Surface
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, index):
+        """Return the frame for index, building it if needed."""
+        frame = self._frames.get(index)
+        if frame is not None:
+            self._frames.move_to_end(index)
+            self.hits += 1
+            return frame
+        self.misses += 1
+        frame = self._build(index)
+        self._frames[index] = frame
+        if len(self._frames) > self.max_frames:
+            self._frames.popitem(last=False)
+        return frame
+
+    def prefetch(self, indexes):
+        """Build the first missing frame of indexes; returns True if it built one.
+
+        Building one frame per call keeps idle-time prefetching from
+        delaying input handling.
+        """
+        for index in indexes:
+            if index not in self._frames:
+                self.get(index)
+                return True
+        return False
+
+    def invalidate(self):
+        """Drop all frames so they are rebuilt from current config and assets."""
+        self._frames.clear()
+
+
+class ImageCache:
+    """Drink images loaded on demand, bounded by a memory budget in bytes.
+
+    load(index) returns the surface for one menu entry. focus(indexes)
+    marks the entries on or next to the screen: they are never evicted
+    and any that are missing are loaded by a background thread, so the
+    next swipe finds them ready. Everything else is dropped least
+    recently used first once the budget is exceeded.
+    """
+
+    def __init__(self, load, budget_bytes):
+        self._load = load
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        self._images = collections.OrderedDict()  # index -> Surface
+        self._pinned = set()
+        self._pending = set()
+        self._queue = queue.Queue()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0  # Loads the caller had to wait for
+        self.prefetched = 0
+        self.evicted = 0
+        self._thread = threading.Thread(target=self._run, name='image-prefetch', daemon=True)
+        self._thread.start()
+
+    def get(self, index):
+        """Return the image for index, loading it now if the prefetch has not."""
+        with self._lock:
+            image = self._images.get(index)
+            if image is not None:
+                self._images.move_to_end(index)
+                self.hits += 1
+                return image
+            self.misses += 1
+        image = self._load(index)
+        self._store(index, image)
+        return image
+
+    def put(self, index, image):
+        """Add an image loaded elsewhere, e.g. during startup."""
+        self._store(index, image)
+
+    def ready(self, index):
+        with self._lock:
+            return index in self._images
+
+    def focus(self, indexes):
+        """Keep indexes resident and load the missing ones in the background."""
+        with self._lock:
+            self._pinned = set(indexes)
+            missing = [i for i in indexes if i not in self._images and i not in self._pending]
+            self._pending.update(missing)
+            self._evict()
+        for index in missing:
+            self._queue.put(index)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=1.0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'prefetched': self.prefetched,
+                'evicted': self.evicted,
+                'images_cached': len(self._images),
+                'size_bytes': self.size_bytes,
+                'budget_bytes': self.budget_bytes,
+            }
+
+    def _run(self):
+        while True:
+            index = self._queue.get()
+            if index is None:
+                return
+            try:
+                if not self.ready(index):
+                    self._store(index, self._load(index))
+                    with self._lock:
+                        self.prefetched += 1
+            except Exception as e:
+                print(f"Error prefetching image {index}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(index)
+
+    def _store(self, index, image):
+        with self._lock:
+            old = self._images.pop(index, None)
+            if old is not None:
+                self.size_bytes -= surface_bytes(old)
+            self._images[index] = image
+            self.size_bytes += surface_bytes(image)
+            self._evict()
+
+    def _evict(self):
+        # Caller holds the lock. Pinned images stay even if they alone exceed the budget.
+        for index in list(self._images):
+            if self.size_bytes <= self.budget_bytes:
+                break
+            if index in self._pinned:
+                continue
+            self.size_bytes -= surface_bytes(self._images.pop(index))
+            self.evicted += 1
+
+
+def surface_bytes(surface):
+    """Memory used by a surface's pixels."""
+    return surface.get_pitch() * surface.get_height()
+
+
+class SpinnerSheet:
+    """Every rotation of a spinner image at fixed angle steps, on one surface.
+
+    pygame.transform.rotate allocates a new surface on every call. Here
+    each step is rotated once up front, cropped to its visible pixels and
+    packed into a sheet, so drawing a frame is a single blit.
+    """
+
+    def __init__(self, image, steps=36):
+        self.steps = steps
+        image = image.convert_alpha()
+        rotated = []
+        for i in range(steps):
+            frame = pygame.transform.rotate(image, 360 * i / steps)
+            bounds = frame.get_bounding_rect()
+            offset = (bounds.x - frame.get_width() // 2, bounds.y - frame.get_height() // 2)
+            rotated.append((frame.subsurface(bounds), offset))
+        
+        cell_width = max(frame.get_width() for frame, _ in rotated)
+        cell_height = max(frame.get_height() for frame, _ in rotated)
+        self.sheet = pygame.Surface((cell_width * steps, cell_height), pygame.SRCALPHA)
+        self.frames = []  # (area on the sheet, offset of its top-left from the centre)
+        for i, (frame, offset) in enumerate(rotated):
+            area = pygame.Rect(i * cell_width, 0, frame.get_width(), frame.get_height())
+            # MAX onto the transparent sheet copies the pixels without blending them
+            self.sheet.blit(frame, area, special_flags=pygame.BLEND_RGBA_MAX)
+            self.frames.append((area, offset))
+
+    def blit(self, surface, center, angle):
+        """Draw the step nearest to angle (degrees, counter-clockwise) centred on center."""
+        area, (dx, dy) = self.frames[round(angle * self.steps / 360) % self.steps]
+        surface.blit(self.sheet, (center[0] + dx, center[1] + dy), area)
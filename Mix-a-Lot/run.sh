@@ -16,6 +16,12 @@ fi
 echo -e "${BLUE}Activating virtual environment...${NC}"
 . venv/bin/activate
 
+# Start the pump daemon unless it is already running (e.g. as mix-a-lot-pumpd.service)
+if ! python3 pump_daemon.py --ping &> /dev/null; then
+    echo -e "${BLUE}Starting pump daemon...${NC}"
+    python3 pump_daemon.py &
+    sleep 2
+fi
 
 # Run the application
 echo -e "${GREEN}Starting Pump Testing Interface...${NC}"
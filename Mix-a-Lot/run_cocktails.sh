@@ -30,6 +30,13 @@ echo -e "${BLUE}Using display${NC} ${GREEN}$current_display${NC}"
 echo -e "${BLUE}Activating virtual environment...${NC}"
 . venv/bin/activate
 
+# Start the pump daemon unless it is already running (e.g. as mix-a-lot-pumpd.service)
+if ! python3 pump_daemon.py --ping &> /dev/null; then
+    echo -e "${BLUE}Starting pump daemon...${NC}"
+    python3 pump_daemon.py &
+    sleep 2
+fi
+
 # Set display environment variables
 export DISPLAY=$current_display
 export SDL_VIDEODRIVER=x11
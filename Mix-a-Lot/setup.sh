@@ -68,11 +68,11 @@ chmod +x run.sh run_cocktails.sh
 # Set up autostart
 echo -e "${BLUE}Setting up automatic startup...${NC}"
 
-# Install systemd service
-echo -e "${BLUE}Installing systemd service...${NC}"
-sudo cp mix-a-lot.service /etc/systemd/system/
+# Install systemd services (the pump daemon owns the GPIO pins, the kiosk is its client)
+echo -e "${BLUE}Installing systemd services...${NC}"
+sudo cp mix-a-lot-pumpd.service mix-a-lot.service /etc/systemd/system/
 sudo systemctl daemon-reload
-sudo systemctl enable mix-a-lot.service
+sudo systemctl enable mix-a-lot-pumpd.service mix-a-lot.service
 
 # Install desktop entry
 echo -e "${BLUE}Installing desktop entry...${NC}"
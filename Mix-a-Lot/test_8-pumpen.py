@@ -1,7 +1,14 @@
 import json
-import time
 import sys
 from gpiozero import DigitalOutputDevice, GPIOZeroError
+import hardware
+from pump_client import exit_if_daemon_running
+
+# Solange der Pump-Daemon läuft, gehören ihm die Pins; dieser Test braucht sie selbst
+exit_if_daemon_running()
+
+# lgpio bzw. simuliertes Backend (siehe hardware.py) als Pin-Factory setzen
+hardware.setup_pin_factory()
 
 # --- Konfiguration ---
 CONFIG_FILE = 'pumpen.json'  # Name deiner JSON-Konfigurationsdatei
@@ -71,9 +78,9 @@ def run_forward(power_pin, direction_pin, duration):
     """Lässt die Pumpe für eine bestimmte Dauer vorwärts laufen."""
     print(f"  -> Vorwärts ({duration}s)...")
     direction_pin.value = FORWARD_LEVEL  # Richtung setzen
-    time.sleep(0.1) # Kurze Pause, damit die Richtung sicher gesetzt ist
+    hardware.clock.sleep(0.1) # Kurze Pause, damit die Richtung sicher gesetzt ist
     power_pin.on()       # Pumpe einschalten
-    time.sleep(duration) # Laufen lassen
+    hardware.clock.sleep(duration) # Laufen lassen
     power_pin.off()      # Pumpe ausschalten
     print("     Stopp.")
 
@@ -81,9 +88,9 @@ def run_backward(power_pin, direction_pin, duration):
     """Lässt die Pumpe für eine bestimmte Dauer rückwärts laufen."""
     print(f"  -> Rückwärts ({duration}s)...")
     direction_pin.value = BACKWARD_LEVEL # Richtung setzen
-    time.sleep(0.1) # Kurze Pause
+    hardware.clock.sleep(0.1) # Kurze Pause
     power_pin.on()        # Pumpe einschalten
-    time.sleep(duration)  # Laufen lassen
+    hardware.clock.sleep(duration)  # Laufen lassen
     power_pin.off()       # Pumpe ausschalten
     print("     Stopp.")
 
@@ -172,13 +179,13 @@ if __name__ == "__main__":
             # Vorwärtslauf
             run_forward(power_pin, direction_pin, TEST_DURATION_SECONDS)
 
-            time.sleep(DELAY_BETWEEN_DIRECTIONS)
+            hardware.clock.sleep(DELAY_BETWEEN_DIRECTIONS)
 
             # Rückwärtslauf
             run_backward(power_pin, direction_pin, TEST_DURATION_SECONDS)
 
             print(f"Test für {pump_label} abgeschlossen.")
-            time.sleep(DELAY_BETWEEN_PUMPS)
+            hardware.clock.sleep(DELAY_BETWEEN_PUMPS)
 
         print("\nAlle Pumpentests erfolgreich abgeschlossen.")
 
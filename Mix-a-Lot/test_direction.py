@@ -1,11 +1,14 @@
 from flask import Flask
 import json
-import time
-from gpiozero import DigitalOutputDevice, GPIOZeroError, Device
-from gpiozero.pins.lgpio import LGPIOFactory
+from gpiozero import DigitalOutputDevice, GPIOZeroError
+import hardware
+from pump_client import exit_if_daemon_running
 
-# Set lgpio as the default pin factory
-Device.pin_factory = LGPIOFactory()
+# While the pump daemon runs it owns the pins; this test needs them itself
+exit_if_daemon_running()
+
+# Set lgpio (or the simulated backend, see hardware.py) as the default pin factory
+hardware.setup_pin_factory()
 
 # Constants
 CONFIG_FILE = 'pumpen.json'
@@ -32,10 +35,10 @@ def test_pump_direction(pump_config):
         # Test Forward
         input(f"\nPress Enter to test FORWARD direction (Direction Pin = {FORWARD_LEVEL})...")
         direction_pin.value = FORWARD_LEVEL
-        time.sleep(0.1)
+        hardware.clock.sleep(0.1)
         print("Running pump...")
         power_pin.on()
-        time.sleep(TEST_DURATION)
+        hardware.clock.sleep(TEST_DURATION)
         power_pin.off()
         
         response = input("\nDid liquid flow in the EXPECTED direction? (y/n): ").lower()
@@ -48,10 +51,10 @@ def test_pump_direction(pump_config):
         # Test Backward
         input(f"\nPress Enter to test BACKWARD direction (Direction Pin = {BACKWARD_LEVEL})...")
         direction_pin.value = BACKWARD_LEVEL
-        time.sleep(0.1)
+        hardware.clock.sleep(0.1)
         print("Running pump...")
         power_pin.on()
-        time.sleep(TEST_DURATION)
+        hardware.clock.sleep(TEST_DURATION)
         power_pin.off()
         
         response = input("\nDid liquid flow in the EXPECTED direction? (y/n): ").lower()
@@ -0,0 +1,78 @@
+"""Time-based tweens advanced by the kiosk's main loop.
+
+An animation used to be its own `while True` loop that drew, flipped and
+ticked until it finished, so input waited for it. A Tween instead only
+knows where a value should be at a given time. Animator.update(now_ms) is
+called once per frame by main(), whose clock alone paces the frames,
+and a running tween can be cancelled or replaced at any moment.
+"""
+
+
+def linear(t):
+    return t
+
+
+def ease_out_cubic(t):
+    """Fast start, gentle stop; feels like a flicked card settling."""
+    return 1 - (1 - t) ** 3
+
+
+def ease_in_out_quad(t):
+    return 2 * t * t if t < 0.5 else 1 - (-2 * t + 2) ** 2 / 2
+
+
+class Tween:
+    """Moves a value from start to end over duration_ms with an easing curve."""
+
+    def __init__(self, start, end, duration_ms, easing=ease_out_cubic, on_done=None):
+        self.start = start
+        self.end = end
+        self.duration_ms = max(duration_ms, 1)
+        self.easing = easing
+        self.on_done = on_done
+        self.started_ms = None  # Set by the first update()
+        self.value = start
+        self.done = False
+
+    def update(self, now_ms):
+        """Return the value at now_ms; marks the tween done at the end."""
+        if self.started_ms is None:
+            self.started_ms = now_ms
+        progress = min((now_ms - self.started_ms) / self.duration_ms, 1.0)
+        self.value = self.start + (self.end - self.start) * self.easing(progress)
+        if progress >= 1.0:
+            self.done = True
+        return self.value
+
+
+class Animator:
+    """Named tweens; starting a tween under a name replaces the one running there."""
+
+    def __init__(self):
+        self.tweens = {}
+
+    def start(self, name, tween):
+        self.tweens[name] = tween
+        return tween
+
+    def cancel(self, name):
+        """Stop the tween without calling on_done; returns it (or None)."""
+        return self.tweens.pop(name, None)
+
+    def get(self, name):
+        return self.tweens.get(name)
+
+    @property
+    def busy(self):
+        return bool(self.tweens)
+
+    def update(self, now_ms):
+        """Advance every tween and call on_done for those that finished."""
+        for name, tween in list(self.tweens.items()):
+            tween.update(now_ms)
+            if tween.done:
+                # on_done may start a new tween under the same name
+                if self.tweens.get(name) is tween:
+                    del self.tweens[name]
+                if tween.on_done:
+                    tween.on_done(tween)